@@ -15,13 +15,23 @@ from src.routes.game_routes import game_bp
 
 # Import services
 from src.services.game_service import GameService
+from src.services.timer_scheduler import turn_timers
+from src.services.matchmaking import matchmaker
+from src.services.leaderboard import leaderboard
+from src.services.presence import presence
+from src.services.user_cache import user_cache
+from src.services.move_committer import move_committer
+from src.models.move_log import move_log_decoder
+from src.utils.board_registry import board_registry
+from src.utils.password_hasher import password_hasher, PasswordHasherBusy
+from src.utils.position_cache import position_cache
+from src.utils.storage import configure_storage
 
 # Initialize Flask app
 app = Flask(__name__, 
             template_folder='app/templates',
             static_folder='app/static')
 app.config['SECRET_KEY'] = 'your-secret-key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///chesster.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JSON_SORT_KEYS'] = False
 app.config['JSON_AS_ASCII'] = False
@@ -29,10 +39,31 @@ app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False
 app.config['SESSION_COOKIE_HTTPONLY'] = True
+app.config['QUEUE_LONG_POLL_TIMEOUT'] = 25  # Seconds a queue status request may wait for a match
+app.config['PASSWORD_HASH_WORKERS'] = 2  # Processes hashing passwords, apart from the request workers
+app.config['PASSWORD_HASH_MAX_PENDING'] = 32  # Hash requests that may wait for a worker before we answer 503
+app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256'
+app.config['MOVE_GROUP_COMMIT'] = False  # Commit the moves of concurrent requests together
+app.config['MOVE_GROUP_COMMIT_INTERVAL'] = 0.005  # Seconds a move write may wait for others to join its commit
+app.config['PACKED_MOVE_LOG'] = False  # Store the moves of new games in one packed row per game
 
-# Initialize database
+# Initialize database (URL from CHESSTER_DATABASE_URL, SQLite tuned for concurrent access)
+configure_storage(app)
 db.init_app(app)
 
+# Initialize password hashing
+password_hasher.configure(
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+    method=app.config['PASSWORD_HASH_METHOD']
+)
+
+# Initialize move writes
+move_committer.configure(
+    enabled=app.config['MOVE_GROUP_COMMIT'],
+    interval=app.config['MOVE_GROUP_COMMIT_INTERVAL']
+)
+
 # Initialize login manager
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -44,7 +75,8 @@ app.register_blueprint(game_bp, url_prefix='/api')
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Runs on every authenticated request, usually answered without a query
+    return user_cache.load(int(user_id))
 
 # Web routes
 @app.route('/')
@@ -85,6 +117,7 @@ def register():
         user.set_password(password)
         db.session.add(user)
         db.session.commit()
+        leaderboard.add(user)
         
         flash('Registration successful! Please log in.')
         return redirect(url_for('login'))
@@ -114,6 +147,7 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    presence.remove(current_user.id)
     logout_user()
     return redirect(url_for('index'))
 
@@ -142,8 +176,9 @@ def battle():
         
         return redirect(url_for('game', game_id=game.id))
     
-    users = User.query.filter(User.id != current_user.id).all()
-    return render_template('battle.html', users=users)
+    # Only the first page of online players is rendered, the search box pages through the rest
+    users, next_cursor = presence.search(exclude=current_user.id)
+    return render_template('battle.html', users=users, next_cursor=next_cursor)
 
 @app.route('/game/<int:game_id>')
 @login_required
@@ -156,6 +191,18 @@ def game(game_id):
     
     return render_template('game.html', game=game)
 
+@app.route('/api/stats')
+@login_required
+def stats():
+    # Sizes and hit rates of the process-level caches, for tuning their capacities
+    return jsonify({
+        'user_cache': user_cache.stats(),
+        'board_registry': board_registry.stats(),
+        'position_cache': position_cache.stats(),
+        'move_log_decoder': move_log_decoder.stats(),
+        'password_hasher': password_hasher.stats()
+    })
+
 # Error handlers
 @app.errorhandler(404)
 def page_not_found(e):
@@ -165,6 +212,16 @@ def page_not_found(e):
 def internal_server_error(e):
     return render_template('500.html'), 500
 
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    # Authentication is overloaded, tell the client to retry instead of queueing
+    app.logger.warning(f"Password hasher busy: {password_hasher.stats()}")
+    if request.path.startswith('/api/'):
+        return jsonify({"error": str(e)}), 503, {'Retry-After': '1'}
+    
+    flash('The server is busy, please try again in a moment')
+    return redirect(request.path)
+
 # API error handler
 @app.errorhandler(Exception)
 def handle_exception(e):
@@ -192,26 +249,47 @@ def log_request_info():
     app.logger.debug('Method: %s', request.method)
     app.logger.debug('User authenticated: %s', current_user.is_authenticated if hasattr(current_user, 'is_authenticated') else False)
 
+@app.before_request
+def record_presence():
+    # Any request from a logged in user counts as a heartbeat
+    if current_user.is_authenticated:
+        presence.touch(current_user)
+
 # Background timer checker
 def timer_checker():
     """Background thread to check for expired timers"""
     print("Starting timer checker thread")
     with app.app_context():
+        scheduled = GameService.schedule_active_games()
+        print(f"Scheduled turn timers for {scheduled} active games")
+        
         while True:
             try:
+                # Sleep until the earliest turn deadline (or an earlier one gets scheduled)
+                turn_timers.wait_for_due()
+                
                 # Check for expired timers
                 games_with_random_moves = GameService.check_expired_timers()
                 if games_with_random_moves:
                     print(f"Made random moves for {len(games_with_random_moves)} games with expired timers")
             except Exception as e:
                 print(f"Error in timer checker: {str(e)}")
-            
-            # Sleep for 1 second
-            time.sleep(1)
+                db.session.rollback()
+                time.sleep(1)
+                
+                # Deadlines popped by the failed check would otherwise be lost
+                GameService.schedule_active_games()
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        
+        # Players who were waiting before a restart keep their place
+        restored = matchmaker.restore()
+        print(f"Restored {restored} players into the matchmaking queue")
+        
+        ranked = leaderboard.load()
+        print(f"Loaded {ranked} players into the leaderboard")
     
     # Print registered routes for debugging
     print("Registered routes:")
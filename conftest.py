@@ -0,0 +1,121 @@
+"""
+Shared fixture and helpers for the test suite.
+
+Every test runs the app against a throwaway SQLite database with three
+players (alice, bob and carol, password testing123), logged in as alice.
+Helpers are imported by the test modules with `from conftest import ...`.
+
+Run with: python -m pytest test_*.py
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import app
+from src.models.user import User, db
+from src.models.game import Game
+from src.services.game_service import GameService
+from src.services.user_cache import user_cache
+from src.utils.board_registry import board_registry
+
+
+def alice_id():
+    """Look up alice's user id, inside an app context"""
+    return User.query.filter_by(username='alice').first().id
+
+
+def login(username):
+    """Log a user in from their own client, which also marks them online"""
+    other_client = app.test_client()
+    response = other_client.post('/api/auth/login', json={'username': username, 'password': 'testing123'})
+    assert response.status_code == 200
+    other_client.get('/api/auth/me')
+    return other_client
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed inside the block"""
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    with app.app_context():
+        # Read endpoints query through the read-only engine
+        engines = [db.engine, db.get_read_only_engine()]
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def create_games(count, finished=False):
+    """Create games between alice and the other players"""
+    with app.app_context():
+        alice = User.query.filter_by(username='alice').first()
+        opponents = User.query.filter(User.id != alice.id).all()
+        game_ids = []
+        for i in range(count):
+            game = GameService.create_game(alice.id, opponents[i % len(opponents)].id)
+            if finished:
+                game.resign(alice.id)
+            game_ids.append(game.id)
+        db.session.commit()
+        return game_ids
+
+
+def play_moves(game_id, moves):
+    """Play a list of UCI moves in a game, skipping the turn timer"""
+    with app.app_context():
+        game = Game.query.get(game_id)
+        for uci in moves:
+            success, error = game.make_move(uci[:2], uci[2:4])
+            assert success, error
+        db.session.commit()
+
+
+def queries_for(client, url):
+    """Count the queries of a GET request that must succeed"""
+    with count_queries() as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(queries)
+
+
+@pytest.fixture
+def client():
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        for name in ('alice', 'bob', 'carol'):
+            user = User(username=name, email=f'{name}@example.com')
+            user.set_password('testing123')
+            db.session.add(user)
+        db.session.commit()
+
+    user_cache.clear()
+    board_registry.clear()  # Game ids start over in every test database
+    test_client = app.test_client()
+    response = test_client.post('/api/auth/login', json={'username': 'alice', 'password': 'testing123'})
+    assert response.status_code == 200
+    # Warm the user cache so every counted request identifies the caller the same way
+    test_client.get('/api/auth/me')
+
+    yield test_client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+    os.close(db_fd)
+    os.remove(db_path)
@@ -0,0 +1,114 @@
+"""
+Move the moves of finished games from ChessMove rows into packed move logs.
+
+Each converted game gets one GameMoveLog row (see src/models/move_log.py) and
+its ChessMove rows are deleted. Active games are left alone, new games are
+stored packed when PACKED_MOVE_LOG is set in app.py:
+
+    python pack_move_logs.py --dry-run                # count rows and packed bytes only
+    python pack_move_logs.py --batch-size 500
+
+SQLite only hands the freed pages back to the file system after a VACUUM.
+"""
+import argparse
+from itertools import groupby
+import time
+
+import chess
+from flask import Flask
+
+from src.models.user import db
+from src.models.game import Game, ChessMove
+from src.models.move_log import GameMoveLog, RANDOM_MOVE_NOTE
+from src.utils.storage import configure_storage
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_storage(app)
+db.init_app(app)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pack the moves of finished games into one row per game")
+    parser.add_argument('--batch-size', type=int, default=500, help="games converted per transaction")
+    parser.add_argument('--dry-run', action='store_true', help="report the savings without writing anything")
+    return parser.parse_args()
+
+
+def build_log(game_id, started_at, rows):
+    """Build the packed log of a game from its (from, to, promotion, notation, timestamp) rows"""
+    log = GameMoveLog(game_id=game_id, started_at=started_at)
+    for from_square, to_square, promotion, notation, timestamp in rows:
+        move = chess.Move(
+            chess.parse_square(from_square),
+            chess.parse_square(to_square),
+            chess.Piece.from_symbol(promotion).piece_type if promotion else None
+        )
+        log.append(move, timestamp or log.last_move_at, random_move=RANDOM_MOVE_NOTE in notation)
+    return log
+
+
+def main():
+    args = parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        last_id = 0
+        games = moves = packed_bytes = 0
+
+        while True:
+            batch = db.session.query(Game.id, Game.start_time).filter(
+                Game.status != 'active',
+                Game.packed_moves.is_(False),
+                Game.id > last_id
+            ).order_by(Game.id).limit(args.batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            game_ids = [game_id for game_id, _ in batch]
+            start_times = dict(batch)
+
+            # Plain columns only, one query for the whole batch
+            rows = db.session.query(
+                ChessMove.game_id, ChessMove.from_square, ChessMove.to_square,
+                ChessMove.promotion, ChessMove.move_notation, ChessMove.timestamp
+            ).filter(ChessMove.game_id.in_(game_ids)).order_by(ChessMove.game_id, ChessMove.ply, ChessMove.id)
+
+            moves_by_game = {
+                game_id: [row[1:] for row in game_rows]
+                for game_id, game_rows in groupby(rows, key=lambda row: row.game_id)
+            }
+            logs = []
+            for game_id in game_ids:
+                game_moves = moves_by_game.get(game_id, [])
+                started_at = start_times[game_id]
+                if game_moves and game_moves[0][4] is not None:
+                    started_at = min(started_at or game_moves[0][4], game_moves[0][4])
+                log = build_log(game_id, started_at, game_moves)
+                logs.append(log)
+                moves += log.count
+                packed_bytes += len(log.codes) + len(log.times)
+            games += len(batch)
+
+            if args.dry_run:
+                continue
+
+            try:
+                db.session.add_all(logs)
+                Game.query.filter(Game.id.in_(game_ids)).update({'packed_moves': True}, synchronize_session=False)
+                ChessMove.query.filter(ChessMove.game_id.in_(game_ids)).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                print(f"Error packing games {game_ids[0]}-{game_ids[-1]}: {str(e)}")
+                db.session.rollback()
+                raise
+
+        action = "Would pack" if args.dry_run else "Packed"
+        print(f"{action} {moves} moves of {games} games into {packed_bytes} bytes "
+              f"({packed_bytes / moves if moves else 0:.1f} bytes per move, {time.perf_counter() - started:.2f}s)")
+        if args.dry_run:
+            print("Dry run, nothing was written.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Recompute every player's rating by replaying all completed games.
+
+Completed games are replayed in (end_time, id) order and the ratings, wins and
+losses of every user are rewritten in one bulk update. Use it after changing
+the K-factor or fixing a bad result:
+
+    python recompute_ratings.py                       # Elo, K=32, like live play
+    python recompute_ratings.py --k-factor 24 --dry-run
+    python recompute_ratings.py --system glicko2 --period-days 7
+
+Glicko-2 also computes a rating deviation and volatility per player, but the
+User table only stores a rating, so only the rating is written (--dry-run
+shows the deviations).
+"""
+import argparse
+import time
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import bindparam
+
+from src.models.user import User, db
+from src.models.game import Game
+from src.services.rating_replay import replay_elo, replay_glicko2
+from src.utils.storage import configure_storage
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_storage(app)
+db.init_app(app)
+
+BATCH_SIZE = 50000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay all completed games and rewrite player ratings")
+    parser.add_argument('--system', choices=['elo', 'glicko2'], default='elo', help="rating system to replay with")
+    parser.add_argument('--k-factor', type=float, default=32, help="Elo K-factor (default 32)")
+    parser.add_argument('--initial-rating', type=int, default=1200, help="rating every player starts from")
+    parser.add_argument('--period-days', type=float, default=7, help="Glicko-2 rating period length in days")
+    parser.add_argument('--tau', type=float, default=0.5, help="Glicko-2 volatility constraint")
+    parser.add_argument('--dry-run', action='store_true', help="print the result without writing it")
+    return parser.parse_args()
+
+
+def load_games():
+    """
+    Load the completed games as column arrays, in play order
+    Only plain columns are fetched and streamed in batches, no Game objects are built
+    """
+    rows = db.session.query(
+        Game.white_player_id, Game.black_player_id, Game.winner_id, Game.end_time
+    ).filter(
+        Game.status != 'active',
+        Game.end_time.isnot(None)
+    ).order_by(Game.end_time, Game.id).yield_per(BATCH_SIZE)
+
+    white, black, winner, end_time = [], [], [], []
+    for white_id, black_id, winner_id, ended in rows:
+        white.append(white_id)
+        black.append(black_id)
+        winner.append(winner_id or 0)  # 0 marks a draw, user ids start at 1
+        end_time.append(ended)
+
+    return (np.array(white, dtype=np.int64), np.array(black, dtype=np.int64),
+            np.array(winner, dtype=np.int64), np.array(end_time, dtype='datetime64[us]'))
+
+
+def main():
+    args = parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        user_ids = np.array([user_id for (user_id,) in db.session.query(User.id).order_by(User.id)], dtype=np.int64)
+        white_ids, black_ids, winner_ids, end_time = load_games()
+        loaded = time.perf_counter()
+
+        # Map user ids to positions in the rating arrays
+        white = np.searchsorted(user_ids, white_ids)
+        black = np.searchsorted(user_ids, black_ids)
+        white_score = np.where(winner_ids == white_ids, 1.0, np.where(winner_ids == black_ids, 0.0, 0.5))
+
+        if args.system == 'elo':
+            ratings = replay_elo(white, black, white_score, len(user_ids),
+                                 initial_rating=args.initial_rating, k_factor=args.k_factor)
+            deviations = None
+        else:
+            if len(end_time):
+                period_length = np.timedelta64(int(args.period_days * 86400), 's')
+                period = (end_time - end_time[0]) // period_length
+            else:
+                period = np.empty(0, dtype=np.int64)
+            # Deviations are only printed and volatilities dropped, users have no columns for them
+            ratings, deviations, _ = replay_glicko2(white, black, white_score, period, len(user_ids),
+                                                    initial_rating=args.initial_rating, tau=args.tau)
+            ratings = np.rint(ratings).astype(np.int64)
+
+        white_won = white_score == 1
+        black_won = white_score == 0
+        won = np.bincount(white[white_won], minlength=len(user_ids)) + \
+            np.bincount(black[black_won], minlength=len(user_ids))
+        lost = np.bincount(black[white_won], minlength=len(user_ids)) + \
+            np.bincount(white[black_won], minlength=len(user_ids))
+        replayed = time.perf_counter()
+
+        print(f"Replayed {len(white)} games for {len(user_ids)} players with {args.system} "
+              f"(load {loaded - started:.2f}s, replay {replayed - loaded:.2f}s)")
+
+        if args.dry_run:
+            for position in np.argsort(-ratings, kind='stable')[:20]:
+                line = f"  user {user_ids[position]}: {ratings[position]}"
+                if deviations is not None:
+                    line += f" (RD {deviations[position]:.0f})"
+                print(line + f", {won[position]} won / {lost[position]} lost")
+            print("Dry run, nothing was written.")
+            return
+
+        try:
+            # One executemany for all users instead of a flush per object
+            users = User.__table__
+            db.session.execute(
+                users.update().where(users.c.id == bindparam('user_id')).values(
+                    elo_rating=bindparam('rating'),
+                    battles_won=bindparam('won'),
+                    battles_lost=bindparam('lost')
+                ),
+                [
+                    {'user_id': user_id, 'rating': rating, 'won': w, 'lost': l}
+                    for user_id, rating, w, l in zip(user_ids.tolist(), ratings.tolist(), won.tolist(), lost.tolist())
+                ]
+            )
+            db.session.commit()
+            print(f"Updated {len(user_ids)} players in {time.perf_counter() - replayed:.2f}s.")
+        except Exception as e:
+            print(f"Error updating ratings: {str(e)}")
+            db.session.rollback()
+            raise
+
+
+if __name__ == '__main__':
+    main()
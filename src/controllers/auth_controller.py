@@ -1,6 +1,8 @@
 from flask import request, jsonify
 from flask_login import login_user, logout_user, current_user, login_required
 from src.models.user import User, db
+from src.services.leaderboard import leaderboard
+from src.services.presence import presence
 import re
 
 def register():
@@ -41,6 +43,7 @@ def register():
     user.set_password(password)
     db.session.add(user)
     db.session.commit()
+    leaderboard.add(user)
     
     return jsonify({"message": "Registration successful"}), 201
 
@@ -74,6 +77,7 @@ def login():
 @login_required
 def logout():
     """Logout the current user"""
+    presence.remove(current_user.id)
     logout_user()
     return jsonify({"message": "Logout successful"}), 200
 
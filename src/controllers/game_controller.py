@@ -1,8 +1,32 @@
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, Response, stream_with_context
 from flask_login import current_user
+import chess
 from src.models.user import User, db
 from src.models.game import Game, ChessMove
 from src.services.game_service import GameService
+from src.services.game_events import game_events
+from src.services.leaderboard import leaderboard
+from src.services.matchmaking import matchmaker
+from src.services.pgn_export import pgn_exporter
+from src.services.presence import presence
+from src.utils.storage import read_only
+
+def _not_modified(etag):
+    """Return a 304 response if the client already has this version, otherwise None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+def _with_etag(payload, etag):
+    """Return a JSON response tagged with the given version"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 def start_game():
     """Start a new chess game"""
@@ -34,6 +58,7 @@ def start_game():
         }
     }), 201
 
+@read_only()
 def get_game(game_id):
     """Get details of a specific game"""
     game = GameService.get_game(game_id)
@@ -45,7 +70,52 @@ def get_game(game_id):
     if not game.is_player_in_game(current_user.id):
         return jsonify({"error": "You are not authorized to view this game"}), 403
     
-    return jsonify({"game": game.get_game_state()}), 200
+    # Unchanged games are answered without building the state
+    etag = game.get_state_etag()
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    return _with_etag({"game": game.get_game_state()}, etag), 200
+
+def stream_game_events(game_id):
+    """Stream game state changes to the client as Server-Sent Events"""
+    game = GameService.get_game(game_id)
+    
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+    
+    # Check if user is a player in this game
+    if not game.is_player_in_game(current_user.id):
+        return jsonify({"error": "You are not authorized to view this game"}), 403
+    
+    # Subscribe before reading the state, so a move made in between is
+    # still delivered (at worst the client gets the same state twice)
+    subscriber = game_events.subscribe(game.id)
+    try:
+        # Send the current state first so the client doesn't need a separate
+        # fetch, the stream itself never touches the database
+        db.session.refresh(game)
+        initial_state = game.get_game_state()
+    except Exception:
+        game_events.unsubscribe(game.id, subscriber)
+        raise
+    events = game_events.stream(game.id, initial_state=initial_state, subscriber=subscriber)
+    user_id = current_user.id
+    
+    def stream():
+        # Every event and keepalive doubles as a presence heartbeat
+        for event in events:
+            presence.heartbeat(user_id)
+            yield event
+    
+    response = Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Also covers a client that disconnects before the stream starts
+    response.call_on_close(lambda: game_events.unsubscribe(game_id, subscriber))
+    return response
 
 def make_move(game_id):
     """Make a move in a chess game"""
@@ -139,9 +209,16 @@ def get_active_games():
         ]
     }), 200
 
+@read_only()
 def get_game_history():
-    """Get completed games for the current user"""
-    games = GameService.get_completed_games_for_user(current_user.id)
+    """Get a page of completed games for the current user"""
+    cursor = request.args.get('cursor')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    
+    try:
+        games, next_cursor = GameService.get_game_history_page(current_user.id, cursor, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     return jsonify({
         "games": [
@@ -156,26 +233,53 @@ def get_game_history():
                 "end_time": game.end_time.isoformat() if game.end_time else None
             }
             for game in games
-        ]
+        ],
+        "next_cursor": next_cursor
     }), 200
 
 def get_available_players():
-    """Get list of players available for a new game"""
-    users = User.query.filter(User.id != current_user.id).all()
+    """
+    Get a page of online players available for a new game
+    Supports a username prefix (q), a rating range and a cursor from the previous page
+    """
+    prefix = request.args.get('q', '').strip()[:20]
+    cursor = request.args.get('cursor') or None
+    min_rating = request.args.get('min_rating', type=int)
+    max_rating = request.args.get('max_rating', type=int)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    
+    # Served from the presence index, offline players are never offered
+    players, next_cursor = presence.search(prefix, min_rating, max_rating, cursor, limit, exclude=current_user.id)
     
     return jsonify({
-        "players": [
-            {
-                "id": user.id,
-                "username": user.username,
-                "elo_rating": user.elo_rating
-            }
-            for user in users
-        ]
+        "players": players,
+        "next_cursor": next_cursor
     }), 200
 
+def get_leaderboard():
+    """Get one page of the leaderboard and the current user's rank"""
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "Invalid page"}), 400
+    
+    players, total = leaderboard.page(page, per_page)
+    
+    return jsonify({
+        "players": players,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "me": {
+            "rank": leaderboard.rank(current_user.id),
+            "elo_rating": current_user.elo_rating
+        }
+    }), 200
+
+@read_only()
 def get_game_moves(game_id):
-    """Get all moves for a specific game"""
+    """Get the moves of a specific game, optionally only those after the `since` ply"""
     game = GameService.get_game(game_id)
     
     if not game:
@@ -185,35 +289,147 @@ def get_game_moves(game_id):
     if not game.is_player_in_game(current_user.id):
         return jsonify({"error": "You are not authorized to view this game"}), 403
     
-    moves = ChessMove.query.filter_by(game_id=game_id).order_by(ChessMove.timestamp).all()
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        since = -1
+    if since < 0:
+        return jsonify({"error": "since must be a non-negative ply"}), 400
+    
+    # Each `since` is a different response, so it is part of the tag
+    etag = game.get_moves_etag(since)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    # Served from the (game_id, ply) index or the game's packed log in one read
+    moves = GameService.get_moves(game, since)
+    
+    return _with_etag({
+        "moves": moves,
+        "ply": game.ply
+    }, etag), 200
+
+@read_only()
+def get_game_position(game_id):
+    """Get the board of a game after a given ply (the current one by default)"""
+    game = GameService.get_game(game_id)
+    
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+    
+    # Check if user is a player in this game
+    if not game.is_player_in_game(current_user.id):
+        return jsonify({"error": "You are not authorized to view this game"}), 403
+    
+    try:
+        ply = int(request.args.get('ply', game.ply))
+    except ValueError:
+        ply = None
+    if ply is None or not 0 <= ply <= game.ply:
+        return jsonify({"error": f"ply must be between 0 and {game.ply}"}), 400
+    
+    etag = game.get_position_etag(ply)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    # Nearest checkpoint plus a few replayed moves, never the whole game
+    board, last_move = game.get_board_at(ply)
+    
+    return _with_etag({
+        "game_id": game.id,
+        "ply": ply,
+        "fen": board.fen(),
+        "turn": "white" if board.turn == chess.WHITE else "black",
+        "is_check": board.is_check(),
+        "last_move": {
+            "from_square": chess.square_name(last_move.from_square),
+            "to_square": chess.square_name(last_move.to_square)
+        } if last_move else None
+    }, etag), 200
+
+@read_only()
+def explore_position():
+    """Get the moves played from a position and the finished games that reached it"""
+    fen = request.args.get('fen', '').strip()
+    if not fen:
+        return jsonify({"error": "fen is required"}), 400
+    
+    try:
+        board = chess.Board(fen)
+    except ValueError:
+        return jsonify({"error": "Invalid FEN"}), 400
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    
+    # Looked up by the position's Zobrist hash, through the index
+    moves, games, total = GameService.explore_position(board, limit)
     
     return jsonify({
-        "moves": [move.to_dict() for move in moves]
+        "fen": board.fen(),
+        "total_games": total,
+        "moves": moves,
+        "games": [
+            {
+                "id": game.id,
+                "white_player": game.white_player.username,
+                "black_player": game.black_player.username,
+                "winner": game.winner.username if game.winner else None,
+                "status": game.status,
+                "ply": ply,
+                "end_time": game.end_time.isoformat() if game.end_time else None
+            }
+            for game, ply in games
+        ]
     }), 200
 
+def export_pgn():
+    """Stream the finished games of the current user as PGN, optionally only those against `user`"""
+    username = request.args.get('user', '').strip()
+    opponent_id = None
+    if username and username != current_user.username:
+        # Games of other players are never exported, only the ones played against them
+        opponent = User.query.filter_by(username=username).first()
+        if not opponent:
+            return jsonify({"error": "User not found"}), 404
+        opponent_id = opponent.id
+    
+    filename = f"chesster-{current_user.username}" + (f"-vs-{username}" if opponent_id else "") + ".pgn"
+    games = pgn_exporter.stream(current_user.id, opponent_id)
+    
+    return Response(stream_with_context(games), mimetype='application/x-chess-pgn', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _match_response(match, user_id=None):
+    """Describe a created match from the current user's point of view"""
+    user_id = user_id or current_user.id
+    return {
+        "status": "matched",
+        "message": "You've been matched with an opponent",
+        "game": {
+            "id": match["id"],
+            "white_player": match["white_player"],
+            "black_player": match["black_player"],
+            "your_color": "white" if match["white_player_id"] == user_id else "black"
+        }
+    }
+
 def join_game_queue():
     """Join the game queue or get matched immediately"""
-    in_queue, opponent_id = GameService.join_game_queue(current_user.id)
+    status, match = matchmaker.join(current_user.id, current_user.elo_rating)
     
-    if in_queue:
+    if status == 'matched':
+        # Immediate match with a similarly rated player, the game was created exactly once
+        return jsonify(_match_response(match)), 200
+    elif status == 'queued':
         # User was added to queue
         return jsonify({
             "status": "queued",
-            "message": "You've been added to the game queue"
-        }), 200
-    elif opponent_id:
-        # Immediate match found
-        game = GameService.create_game(current_user.id, opponent_id)
-        
-        return jsonify({
-            "status": "matched",
-            "message": "You've been matched with an opponent",
-            "game": {
-                "id": game.id,
-                "white_player": game.white_player.username,
-                "black_player": game.black_player.username,
-                "your_color": "white" if game.white_player_id == current_user.id else "black"
-            }
+            "message": "You've been added to the game queue",
+            "position": matchmaker.position(current_user.id)
         }), 200
     else:
         # User is already in queue
@@ -225,66 +441,38 @@ def join_game_queue():
 def check_queue_status():
     """Check for a match while in queue (long polling)"""
     try:
-        matched, opponent_id = GameService.check_for_match(current_user.id)
+        # Block until matched or the timeout expires, the client asks again right away
+        max_timeout = current_app.config.get('QUEUE_LONG_POLL_TIMEOUT', 25)
+        timeout = min(max(request.args.get('timeout', max_timeout, type=float), 0), max_timeout)
+        user_id = current_user.id
+        
+        # Don't hold on to a database connection while waiting
+        db.session.close()
         
-        if matched and opponent_id:
-            # Check if a game with this opponent already exists
-            from src.models.game import Game  # Import Game model here to ensure it's available
-            
-            recent_game = Game.query.filter(
-                (((Game.white_player_id == current_user.id) & (Game.black_player_id == opponent_id)) |
-                 ((Game.white_player_id == opponent_id) & (Game.black_player_id == current_user.id))) &
-                (Game.status == 'active')
-            ).order_by(Game.start_time.desc()).first()
-            
-            if recent_game:
-                # Game already exists, return it
-                return jsonify({
-                    "status": "matched",
-                    "message": "You've been matched with an opponent",
-                    "game": {
-                        "id": recent_game.id,
-                        "white_player": recent_game.white_player.username,
-                        "black_player": recent_game.black_player.username,
-                        "your_color": "white" if recent_game.white_player_id == current_user.id else "black"
-                    }
-                }), 200
-            
-            # Create a new game with the opponent if we're the second player
-            # The first player will find this game in their next poll
-            from src.models.game_queue import GameQueue
-            
-            user_entry = GameQueue.query.filter_by(user_id=current_user.id).first()
-            opponent_entry = GameQueue.query.filter_by(user_id=opponent_id).first()
-            
-            if user_entry and opponent_entry and user_entry.joined_at > opponent_entry.joined_at:
-                # This user joined second, create the game
-                game = GameService.create_game(current_user.id, opponent_id)
-                
-                # Don't remove users from queue yet - they'll be removed after redirection
-                # We'll only create the game but keep them in queue until they navigate to game page
-                
-                return jsonify({
-                    "status": "matched",
-                    "message": "You've been matched with an opponent",
-                    "game": {
-                        "id": game.id,
-                        "white_player": game.white_player.username,
-                        "black_player": game.black_player.username,
-                        "your_color": "white" if game.white_player_id == current_user.id else "black"
-                    }
-                }), 200
-            
-            # Only report that we found a match but wait for other player to create game
+        # Served from memory, no database work while waiting
+        status, match = matchmaker.wait_for_match(user_id, timeout)
+        
+        if status == 'matched':
+            return jsonify(_match_response(match, user_id)), 200
+        
+        if status == 'matching':
+            # The opponent is creating the game right now
             return jsonify({
                 "status": "matching",
                 "message": "Found a potential opponent, waiting for confirmation..."
             }), 200
         
-        # Still in queue, no match yet
+        if status == 'waiting':
+            # Still in queue, no match yet
+            return jsonify({
+                "status": "waiting",
+                "message": "Still waiting for an opponent...",
+                "position": matchmaker.position(user_id)
+            }), 200
+        
         return jsonify({
-            "status": "waiting",
-            "message": "Still waiting for an opponent..."
+            "status": "not_in_queue",
+            "message": "You are not in the game queue"
         }), 200
         
     except Exception as e:
@@ -297,10 +485,10 @@ def check_queue_status():
 
 def leave_game_queue():
     """Leave the game queue"""
-    success = GameService.leave_game_queue(current_user.id)
+    matchmaker.leave(current_user.id)
     
     # Always return success, regardless of whether the user was in the queue or not
     return jsonify({
         "status": "success",
         "message": "You've been removed from the game queue"
-    }), 200 
\ No newline at end of file
+    }), 200
\ No newline at end of file
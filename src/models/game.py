@@ -1,5 +1,9 @@
 from datetime import datetime
 from src.models.user import db
+from src.models.move_log import encode_move
+from src.models.position import BoardCheckpoint, GamePosition, CHECKPOINT_INTERVAL, position_hash
+from src.utils.board_registry import board_registry
+from src.utils.position_cache import position_cache
 import chess  # Updated import name
 import json
 import random
@@ -16,16 +20,48 @@ class Game(db.Model):
     end_time = db.Column(db.DateTime, nullable=True)
     turn_time_limit = db.Column(db.Integer, default=3)  # Default time limit of 60 seconds per turn
     last_move_time = db.Column(db.DateTime, default=datetime.utcnow)  # Timestamp of the last move
+    ply = db.Column(db.Integer, default=0, nullable=False)  # Number of half-moves played, used as the game version
+    packed_moves = db.Column(db.Boolean, default=False, nullable=False)  # Moves kept in a GameMoveLog instead of ChessMove rows
     
     # Relationships
     white_player = db.relationship('User', foreign_keys=[white_player_id])
     black_player = db.relationship('User', foreign_keys=[black_player_id])
     winner = db.relationship('User', foreign_keys=[winner_id])
     moves = db.relationship('ChessMove', backref='game', lazy=True, cascade="all, delete-orphan")
+    move_log = db.relationship('GameMoveLog', uselist=False, cascade="all, delete-orphan")
+    
+    # Game history is paged per player by (end_time, id), the status rides along
+    # so finished games can be told apart without touching the table
+    __table_args__ = (
+        db.Index('ix_game_white_history', 'white_player_id', 'end_time', 'id', 'status'),
+        db.Index('ix_game_black_history', 'black_player_id', 'end_time', 'id', 'status'),
+    )
+    
+    # Every ORM update is conditional on the ply it was loaded at (UPDATE ...
+    # WHERE ply = loaded, like the move committer), so a write that lost a
+    # race raises StaleDataError instead of overwriting the newer move
+    __mapper_args__ = {'version_id_col': ply, 'version_id_generator': False}
     
     def get_board(self):
         """Return a chess.Board object representing the current state"""
-        return chess.Board(self.board_state)
+        with self.live_board() as live:
+            return live.board.copy(stack=False)
+    
+    def live_board(self):
+        """Check out the cached board of this game (parsed from FEN only on a cache miss)"""
+        return board_registry.checkout(self.id, self.ply or 0, self.board_state, cache=self.status == 'active')
+    
+    def get_state_etag(self):
+        """Return an entity tag that changes whenever the game state changes"""
+        return f"game-{self.id}-{self.ply or 0}-{self.status}"
+    
+    def get_moves_etag(self, since=0):
+        """Return an entity tag for the moves after the `since` ply, which changes whenever a move is added"""
+        return f"moves-{self.id}-{self.ply or 0}-{since}"
+    
+    def get_position_etag(self, ply):
+        """Return an entity tag for the position after a ply, which never changes once played"""
+        return f"position-{self.id}-{ply}"
     
     def is_player_turn(self, user_id):
         """Check if it's the given user's turn"""
@@ -41,7 +77,12 @@ class Game(db.Model):
     
     def make_move(self, from_square, to_square, promotion=None):
         """Make a move on the board and update the game state"""
-        board = self.get_board()
+        with self.live_board() as live:
+            return self._make_move(live, from_square, to_square, promotion)
+    
+    def _make_move(self, live, from_square, to_square, promotion=None, note=None):
+        """Make a move on a checked out live board"""
+        board = live.board
         
         # Create the move object
         try:
@@ -65,24 +106,51 @@ class Game(db.Model):
         # Store the current player's ID before changing the turn
         current_player_id = self.white_player_id if self.current_turn == 'white' else self.black_player_id
         
-        # Make the move
-        board.push(move)
+        # Loaded before the game changes, the lazy load would flush them otherwise
+        move_log = self.move_log if self.packed_moves else None
+        if live.repetitions is None:
+            live.seed_repetitions(self._repetition_history(board))
+        
+        # Make the move and count the position it leads to
+        live.push(move)
+        key = position_hash(board)
+        repetitions = live.count_position(key)
         
         # Update game state
-        self.board_state = board.fen()
+        self.ply = live.version
+        self.board_state = live.fen
         self.current_turn = 'black' if self.current_turn == 'white' else 'white'
         self.last_move_time = datetime.utcnow()  # Update the timestamp of the last move
         
-        # Create move record with the correct player ID (the one who made the move)
-        chess_move = ChessMove(
+        if note:
+            san_notation += f" ({note})"
+        
+        if move_log is not None:
+            # SAN and player are derived again when the log is read
+            move_log.append(move, self.last_move_time, random_move=note is not None)
+        else:
+            # Create move record with the correct player ID (the one who made the move)
+            chess_move = ChessMove(
+                game_id=self.id,
+                player_id=current_player_id,
+                ply=self.ply,
+                from_square=from_square,
+                to_square=to_square,
+                promotion=promotion,
+                move_notation=san_notation
+            )
+            db.session.add(chess_move)
+        
+        # Index the new position so it can be found across games
+        db.session.add(GamePosition(
             game_id=self.id,
-            player_id=current_player_id,
-            from_square=from_square,
-            to_square=to_square,
-            promotion=promotion,
-            move_notation=san_notation
-        )
-        db.session.add(chess_move)
+            ply=self.ply,
+            position_hash=key,
+            move_code=encode_move(move)
+        ))
+        
+        if self.ply % CHECKPOINT_INTERVAL == 0:
+            db.session.add(BoardCheckpoint(game_id=self.id, ply=self.ply, fen=self.board_state))
         
         # Check for game ending conditions
         if board.is_checkmate():
@@ -95,9 +163,36 @@ class Game(db.Model):
         elif board.is_insufficient_material():
             self.status = 'draw'
             self.end_time = datetime.utcnow()
+        elif repetitions >= 3 or board.halfmove_clock >= 100:
+            # Threefold repetition or fifty moves without a capture or pawn move
+            self.status = 'draw'
+            self.end_time = datetime.utcnow()
+        
+        if self.status != 'active':
+            board_registry.evict(self.id)
         
         return True, None
     
+    def _repetition_history(self, board):
+        """
+        Return the position hashes since the last capture or pawn move, to seed the repetition table
+        Read from the position index, games without index rows are replayed from their moves
+        """
+        first_ply = max((self.ply or 0) - board.halfmove_clock, 0)
+        hashes = [key for (key,) in db.session.query(GamePosition.position_hash).filter(
+            GamePosition.game_id == self.id,
+            GamePosition.ply >= first_ply
+        ).order_by(GamePosition.ply)]
+        if len(hashes) == (self.ply or 0) - first_ply + 1:
+            return hashes
+        
+        replay = chess.Board()
+        hashes = [position_hash(replay)]
+        for move in self.get_move_dicts():
+            replay.push_uci(f"{move['from_square']}{move['to_square']}{move['promotion'] or ''}")
+            hashes.append(position_hash(replay))
+        return hashes[first_ply:]
+    
     def resign(self, user_id):
         """Player resigns the game"""
         if not self.is_player_in_game(user_id):
@@ -109,11 +204,16 @@ class Game(db.Model):
         self.status = 'resigned'
         self.winner_id = self.black_player_id if user_id == self.white_player_id else self.white_player_id
         self.end_time = datetime.utcnow()
+        board_registry.evict(self.id)
         return True, None
     
     def get_game_state(self):
         """Return a dictionary with the current game state"""
-        board = self.get_board()
+        # Legal moves etc. only change between moves, so look the position up first
+        position = position_cache.get(self.board_state)
+        if position is None:
+            with self.live_board() as live:
+                position = position_cache.put(self.board_state, live.board)
         
         state = {
             'id': self.id,
@@ -122,10 +222,10 @@ class Game(db.Model):
             'board': self.board_state,
             'current_turn': self.current_turn,
             'status': self.status,
-            'is_check': board.is_check(),
-            'legal_moves': [move.uci() for move in board.legal_moves],
-            'piece_map': {str(sq): str(piece) for sq, piece in board.piece_map().items()},
-            'last_move': None if not self.moves else self.moves[-1].to_dict(),
+            'is_check': position['is_check'],
+            'legal_moves': position['legal_moves'],
+            'piece_map': position['piece_map'],
+            'last_move': self.get_last_move_dict(),
             'turn_time_limit': self.turn_time_limit,
             'time_remaining': self.get_time_remaining()
         }
@@ -135,6 +235,68 @@ class Game(db.Model):
         
         return state
         
+    def get_move_dicts(self, since=0):
+        """Return the moves after the given ply as dictionaries, whichever way the game stores them"""
+        if self.packed_moves:
+            return self.move_log.to_dicts(self, since)
+        
+        moves = ChessMove.query.options(db.joinedload(ChessMove.player)).filter(
+            ChessMove.game_id == self.id,
+            ChessMove.ply > since
+        ).order_by(ChessMove.ply).all()
+        return [move.to_dict() for move in moves]
+    
+    def get_chess_moves(self, after, upto):
+        """Return the moves of plies after+1 to upto as chess.Move objects"""
+        if self.packed_moves:
+            return self.move_log.get_moves(after, upto)
+        
+        rows = db.session.query(ChessMove.from_square, ChessMove.to_square, ChessMove.promotion).filter(
+            ChessMove.game_id == self.id,
+            ChessMove.ply > after,
+            ChessMove.ply <= upto
+        ).order_by(ChessMove.ply)
+        return [chess.Move.from_uci(f"{from_square}{to_square}{promotion or ''}")
+                for from_square, to_square, promotion in rows]
+    
+    def get_board_at(self, ply):
+        """
+        Return the board after the given ply and the move that led to it (None at ply 0)
+        Rebuilt from the nearest earlier checkpoint, replaying at most CHECKPOINT_INTERVAL moves
+        """
+        if ply == 0:
+            return chess.Board(), None
+        
+        # Strictly before the ply, so the move that reached it is always replayed
+        checkpoint = BoardCheckpoint.query.filter(
+            BoardCheckpoint.game_id == self.id,
+            BoardCheckpoint.ply < ply
+        ).order_by(BoardCheckpoint.ply.desc()).first()
+        
+        if checkpoint:
+            board, start = chess.Board(checkpoint.fen), checkpoint.ply
+        else:
+            board, start = chess.Board(), 0
+        
+        moves = self.get_chess_moves(start, ply)
+        for move in moves:
+            board.push(move)
+        return board, moves[-1] if moves else None
+    
+    def get_last_move_dict(self):
+        """Return the most recent move as a dictionary, looked up by ply instead of loading every move"""
+        if not self.ply:
+            return None
+        
+        if self.packed_moves:
+            moves = self.move_log.to_dicts(self, self.ply - 1)
+            return moves[-1] if moves else None
+        
+        last_move = ChessMove.query.options(db.joinedload(ChessMove.player)).filter_by(
+            game_id=self.id, ply=self.ply
+        ).first()
+        return last_move.to_dict() if last_move else None
+        
     def get_time_remaining(self):
         """Get the remaining time for the current turn in seconds"""
         if self.status != 'active':
@@ -157,31 +319,24 @@ class Game(db.Model):
         
     def make_random_move(self):
         """Make a random legal move and return whether it was successful"""
-        board = self.get_board()
-        
-        # Get all legal moves
-        legal_moves = list(board.legal_moves)
-        if not legal_moves:
-            return False
+        with self.live_board() as live:
+            # Get all legal moves
+            legal_moves = list(live.board.legal_moves)
+            if not legal_moves:
+                return False
+                
+            # Select a random move
+            random_move = random.choice(legal_moves)
             
-        # Select a random move
-        random_move = random.choice(legal_moves)
-        
-        # Convert move to uci format
-        from_square = chess.square_name(random_move.from_square)
-        to_square = chess.square_name(random_move.to_square)
-        promotion = random_move.promotion_char() if random_move.promotion else None
-        
-        # Make the move
-        success, _ = self.make_move(from_square, to_square, promotion)
-        
-        if success:
-            # Create a note that this was a random move due to time expiration
-            note = "Random move due to time limit expiration"
-            # Update the last move's note if it exists
-            if self.moves:
-                last_move = self.moves[-1]
-                last_move.move_notation += f" ({note})"
+            # Convert move to uci format
+            from_square = chess.square_name(random_move.from_square)
+            to_square = chess.square_name(random_move.to_square)
+            promotion = random_move.promotion_char() if random_move.promotion else None
+            
+            # Make the move on the same board we picked it from, with a note
+            # that this was a random move due to time expiration
+            success, _ = self._make_move(live, from_square, to_square, promotion,
+                                         note="Random move due to time limit expiration")
                 
         return success
 
@@ -190,6 +345,7 @@ class ChessMove(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
     player_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ply = db.Column(db.Integer, nullable=True)  # 1-based position of the move within its game
     from_square = db.Column(db.String(2), nullable=False)  # e.g., "e2"
     to_square = db.Column(db.String(2), nullable=False)    # e.g., "e4"
     promotion = db.Column(db.String(1), nullable=True)     # piece type for pawn promotion
@@ -199,11 +355,16 @@ class ChessMove(db.Model):
     # Relationships
     player = db.relationship('User', foreign_keys=[player_id])
     
+    __table_args__ = (
+        db.Index('ix_chess_move_game_ply', 'game_id', 'ply'),
+    )
+    
     def to_dict(self):
         """Return a dictionary representation of the move"""
         return {
             'id': self.id,
             'game_id': self.game_id,
+            'ply': self.ply,
             'player': self.player.username,
             'from_square': self.from_square,
             'to_square': self.to_square,
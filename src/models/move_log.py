@@ -0,0 +1,212 @@
+"""
+Packed move log, the compact alternative to one ChessMove row per ply.
+
+A game stored this way keeps all its moves in one GameMoveLog row:
+
+- `codes` holds one little-endian 16-bit code per ply: from square (6 bits),
+  to square (6 bits), promotion piece (3 bits) and a flag for random moves
+  made on time expiration (1 bit)
+- `times` holds the move timestamps as unsigned LEB128 varints, each the
+  number of milliseconds since the previous move (the first since started_at)
+
+SAN, players and timestamps are not stored per move, they are derived when
+the moves are read: players from the ply, timestamps from the deltas and SAN
+by replaying the codes on a board (see MoveLogDecoder). A typical move takes
+3-4 bytes instead of a full row plus its index entries, and a whole game is
+a single read by primary key.
+"""
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import sys
+import threading
+
+import chess
+
+from src.models.user import db
+
+# Promotion piece of each 3-bit promotion code
+PROMOTION_PIECES = (None, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN)
+
+RANDOM_MOVE_FLAG = 0x8000
+RANDOM_MOVE_NOTE = "Random move due to time limit expiration"
+
+
+def encode_move(move, random_move=False):
+    """Pack a chess.Move into a 16-bit move code"""
+    code = move.from_square | move.to_square << 6 | PROMOTION_PIECES.index(move.promotion) << 12
+    return code | RANDOM_MOVE_FLAG if random_move else code
+
+
+def decode_move(code):
+    """Unpack a move code, returns (chess.Move, random_move)"""
+    move = chess.Move(code & 0x3F, code >> 6 & 0x3F, PROMOTION_PIECES[code >> 12 & 0x7])
+    return move, bool(code & RANDOM_MOVE_FLAG)
+
+
+def unpack_codes(data):
+    """Read a packed code blob into an array of move codes"""
+    codes = array('H', data)
+    if sys.byteorder == 'big':
+        codes.byteswap()
+    return codes
+
+
+def encode_varint(value):
+    """Encode a non-negative integer as an unsigned LEB128 varint"""
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data):
+    """Decode a run of unsigned LEB128 varints"""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def replay_notations(data, board=None):
+    """
+    Yield (SAN, random_move) for every code in a packed code blob
+    Replays on the given board (the start position by default), which is left after the last move
+    """
+    board = board if board is not None else chess.Board()
+    for code in unpack_codes(data):
+        move, random_move = decode_move(code)
+        yield board.san(move), random_move
+        board.push(move)
+
+
+class GameMoveLog(db.Model):
+    __tablename__ = 'game_move_log'
+
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)  # Base of the first time delta
+    last_move_at = db.Column(db.DateTime, nullable=False)  # Sum of all deltas, so appending needs no decoding
+    codes = db.Column(db.LargeBinary, nullable=False, default=b'')
+    times = db.Column(db.LargeBinary, nullable=False, default=b'')
+
+    def __init__(self, started_at=None, **kwargs):
+        started_at = started_at or datetime.utcnow()
+        kwargs.setdefault('codes', b'')
+        kwargs.setdefault('times', b'')
+        kwargs.setdefault('last_move_at', started_at)
+        super().__init__(started_at=started_at, **kwargs)
+
+    @property
+    def count(self):
+        """Number of plies in the log"""
+        return len(self.codes) // 2
+
+    def append(self, move, timestamp, random_move=False):
+        """Add a move played at the given time"""
+        delta = max(0, round((timestamp - self.last_move_at) / timedelta(milliseconds=1)))
+        # New bytes objects rather than in-place changes, so the row is flagged as dirty
+        self.codes = self.codes + encode_move(move, random_move).to_bytes(2, 'little')
+        self.times = self.times + encode_varint(delta)
+        self.last_move_at = self.last_move_at + timedelta(milliseconds=delta)
+
+    def get_moves(self, start=0, stop=None):
+        """Return the moves of plies start+1 to stop as chess.Move objects, without decoding notation"""
+        return [decode_move(code)[0] for code in unpack_codes(self.codes)[start:stop]]
+
+    def get_timestamps(self):
+        """Return the time of every move"""
+        timestamps = []
+        current = self.started_at
+        for delta in decode_varints(self.times):
+            current += timedelta(milliseconds=delta)
+            timestamps.append(current)
+        return timestamps
+
+    def to_dicts(self, game, since=0):
+        """Decode the moves after the given ply in the same shape as ChessMove.to_dict"""
+        if since >= self.count:
+            return []
+
+        codes = unpack_codes(self.codes)
+        notations = move_log_decoder.notations(self.game_id, self.codes)
+        timestamps = self.get_timestamps()
+        players = (game.white_player.username, game.black_player.username)
+
+        moves = []
+        for index in range(since, len(codes)):
+            move, random_move = decode_move(codes[index])
+            notation = notations[index]
+            if random_move:
+                notation += f" ({RANDOM_MOVE_NOTE})"
+            moves.append({
+                'id': None,  # Packed moves have no row of their own
+                'game_id': self.game_id,
+                'ply': index + 1,
+                'player': players[index % 2],
+                'from_square': chess.square_name(move.from_square),
+                'to_square': chess.square_name(move.to_square),
+                'promotion': chess.piece_symbol(move.promotion) if move.promotion else None,
+                'move_notation': notation,
+                'timestamp': timestamps[index].isoformat()
+            })
+        return moves
+
+
+class MoveLogDecoder:
+    """
+    Bounded LRU of the SAN of packed move logs, keyed by game id.
+
+    SAN isn't stored in the packed log, so reading it means replaying the
+    moves from the start position. An entry keeps the board it replayed on,
+    so the next read of a game that has grown only replays the new moves.
+    """
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self._entries = OrderedDict()  # game_id -> (board, decoded code bytes, notations)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def notations(self, game_id, codes):
+        """Return the SAN of every move in a packed code blob"""
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is not None and codes.startswith(entry[1]):
+                self.hits += 1
+                self._entries.move_to_end(game_id)
+            else:
+                # Unknown game, or a log that doesn't continue the one we decoded
+                self.misses += 1
+                entry = (chess.Board(), b'', [])
+
+            board, decoded, notations = entry
+            notations.extend(san for san, _ in replay_notations(codes[len(decoded):], board))
+
+            self._entries[game_id] = (board, codes, notations)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            return list(notations)
+
+    def clear(self):
+        """Drop every decoded log"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache size and hit/miss counters"""
+        with self._lock:
+            size = len(self._entries)
+        return {'size': size, 'capacity': self.capacity, 'hits': self.hits, 'misses': self.misses}
+
+
+# Shared decoder for the whole process
+move_log_decoder = MoveLogDecoder()
@@ -0,0 +1,56 @@
+"""
+Position index, one row per ply of every game keyed by a Zobrist hash, and
+board checkpoints to rebuild any past position of a game quickly.
+
+The hash is the standard Polyglot Zobrist hash of the position (pieces, side
+to move, castling rights and a capturable en passant square), stored as a
+signed 64-bit integer so it fits an SQL BIGINT. The ply counters of the FEN
+are not part of it, so transpositions and different move numbers share a
+hash. Each row also keeps the code of the move that led to it (see
+src/models/move_log.py), so the moves played from a position are found by
+joining a row to the next ply of the same game.
+
+Every CHECKPOINT_INTERVAL plies the FEN of the game is stored as a
+BoardCheckpoint, so the board at any ply is the nearest earlier checkpoint
+plus at most CHECKPOINT_INTERVAL replayed moves.
+"""
+import chess
+import chess.polyglot
+
+from src.models.user import db
+
+CHECKPOINT_INTERVAL = 16  # Plies between board checkpoints
+
+
+def position_hash(board):
+    """Return the Zobrist hash of a board as a signed 64-bit integer"""
+    value = chess.polyglot.zobrist_hash(board)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class GamePosition(db.Model):
+    __tablename__ = 'game_position'
+
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), primary_key=True)
+    ply = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 is the start position
+    position_hash = db.Column(db.BigInteger, nullable=False)
+    move_code = db.Column(db.Integer, nullable=True)  # Packed move that reached the position, None at ply 0
+
+    # Lookups by hash are answered from the index alone, and the rows are
+    # clustered by (game_id, ply) so the next ply of a game is a direct seek
+    __table_args__ = (
+        db.Index('ix_game_position_hash', 'position_hash', 'game_id', 'ply'),
+        {'sqlite_with_rowid': False},
+    )
+
+
+class BoardCheckpoint(db.Model):
+    __tablename__ = 'board_checkpoint'
+
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), primary_key=True)
+    ply = db.Column(db.Integer, primary_key=True, autoincrement=False)  # A multiple of CHECKPOINT_INTERVAL
+    fen = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        {'sqlite_with_rowid': False},
+    )
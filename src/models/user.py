@@ -1,9 +1,9 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.utils.password_hasher import password_hasher
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+from src.utils.storage import Storage
 
-db = SQLAlchemy()
+db = Storage()
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -16,10 +16,11 @@ class User(UserMixin, db.Model):
     date_registered = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Hashing runs on the password hasher's worker pool, off the request thread
+        self.password_hash = password_hasher.hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
     
     def update_rating(self, opponent_rating, result):
         # Simple ELO rating update
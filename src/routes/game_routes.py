@@ -24,6 +24,11 @@ def start_game():
 def get_game(game_id):
     return game_controller.get_game(game_id)
 
+@game_bp.route('/games/<int:game_id>/events', methods=['GET'])
+@api_login_required
+def stream_game_events(game_id):
+    return game_controller.stream_game_events(game_id)
+
 @game_bp.route('/games/<int:game_id>/move', methods=['POST'])
 @api_login_required
 def make_move(game_id):
@@ -50,6 +55,11 @@ def offer_draw(game_id):
 def get_game_moves(game_id):
     return game_controller.get_game_moves(game_id)
 
+@game_bp.route('/games/<int:game_id>/position', methods=['GET'])
+@api_login_required
+def get_game_position(game_id):
+    return game_controller.get_game_position(game_id)
+
 @game_bp.route('/active-games', methods=['GET'])
 @api_login_required
 def get_active_games():
@@ -65,6 +75,21 @@ def get_game_history():
 def get_available_players():
     return game_controller.get_available_players()
 
+@game_bp.route('/leaderboard', methods=['GET'])
+@api_login_required
+def get_leaderboard():
+    return game_controller.get_leaderboard()
+
+@game_bp.route('/explorer', methods=['GET'])
+@api_login_required
+def explore_position():
+    return game_controller.explore_position()
+
+@game_bp.route('/export/pgn', methods=['GET'])
+@api_login_required
+def export_pgn():
+    return game_controller.export_pgn()
+
 # Game queue routes
 @game_bp.route('/queue/join', methods=['POST'])
 @api_login_required
@@ -0,0 +1,103 @@
+import json
+import queue
+import threading
+
+
+class GameEventBroker:
+    """
+    In-process publish/subscribe hub for game state changes.
+
+    Every subscriber of a game gets its own bounded queue. A state change is
+    serialized once in publish() and the same payload is handed to every
+    subscriber, so the cost of a move no longer depends on how often clients
+    poll. Subscribers only see events published by this process.
+    """
+
+    def __init__(self, max_pending=16):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # game_id -> set of queue.Queue
+        self._max_pending = max_pending
+
+    def subscribe(self, game_id):
+        """Register a new subscriber for a game and return its queue"""
+        subscriber = queue.Queue(maxsize=self._max_pending)
+        with self._lock:
+            self._subscribers.setdefault(game_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, game_id, subscriber):
+        """Remove a subscriber queue from a game"""
+        with self._lock:
+            subscribers = self._subscribers.get(game_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[game_id]
+
+    def subscriber_count(self, game_id):
+        """Get the number of connected subscribers for a game"""
+        with self._lock:
+            return len(self._subscribers.get(game_id, ()))
+
+    def publish(self, game_id, state):
+        """
+        Publish a game state to every subscriber of the game
+        Returns the number of subscribers the event was delivered to
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(game_id, ()))
+
+        if not subscribers:
+            return 0
+
+        payload = json.dumps(state)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                # A slow client only needs the latest state, drop the oldest one
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(payload)
+                except queue.Full:
+                    pass
+        return len(subscribers)
+
+    def publish_game(self, game):
+        """Publish the current state of a game if anyone is listening"""
+        # Skip building the state entirely when nobody is subscribed
+        if not self.subscriber_count(game.id):
+            return 0
+        return self.publish(game.id, game.get_game_state())
+
+    def stream(self, game_id, initial_state=None, keepalive=15, subscriber=None):
+        """
+        Generator yielding Server-Sent Events for a game
+        The initial state (if given) is sent first so a (re)connecting client is in sync.
+        Pass a queue from subscribe() taken before the initial state was read, so
+        the events published in between are not lost.
+        """
+        if subscriber is None:
+            subscriber = self.subscribe(game_id)
+        try:
+            if initial_state is not None:
+                yield f"event: state\ndata: {json.dumps(initial_state)}\n\n"
+
+            while True:
+                try:
+                    payload = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: state\ndata: {payload}\n\n"
+        finally:
+            self.unsubscribe(game_id, subscriber)
+
+
+# Shared broker for the whole process
+game_events = GameEventBroker()
@@ -1,7 +1,22 @@
-from src.models.game import Game, ChessMove
+from flask import current_app
+from src.models.game import Game
+from src.models.move_log import GameMoveLog, decode_move
+from src.models.position import GamePosition, position_hash
 from src.models.user import User, db
-from src.models.game_queue import GameQueue
+from src.services.game_events import game_events
+from src.services.leaderboard import leaderboard
+from src.services.move_committer import move_committer
+from src.services.timer_scheduler import turn_timers
+from src.services.user_cache import user_cache
+from src.utils.board_registry import board_registry
+from src.utils.storage import after_commit
+from sqlalchemy import case, func, tuple_
+from sqlalchemy.orm import aliased, joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from functools import partial
+import base64
 import chess
+import heapq
 import random
 from datetime import datetime
 
@@ -18,6 +33,7 @@ class GameService:
         white_player_id, black_player_id = players
         
         # Create new game
+        now = datetime.utcnow()
         game = Game(
             white_player_id=white_player_id,
             black_player_id=black_player_id,
@@ -25,22 +41,38 @@ class GameService:
             status='active',
             current_turn='white',
             turn_time_limit=3,  # Default 60 seconds per turn
-            last_move_time=datetime.utcnow()
+            last_move_time=now
         )
+        if current_app.config.get('PACKED_MOVE_LOG', False):
+            game.packed_moves = True
+            game.move_log = GameMoveLog(started_at=now)
         
         db.session.add(game)
+        db.session.flush()
+        # The start position is indexed like every later one
+        db.session.add(GamePosition(game_id=game.id, ply=0, position_hash=position_hash(chess.Board())))
         db.session.commit()
+        turn_timers.schedule(game)
         return game
     
+    @staticmethod
+    def _with_players(query):
+        """Load the players and winner of the games in the same query"""
+        return query.options(
+            joinedload(Game.white_player),
+            joinedload(Game.black_player),
+            joinedload(Game.winner)
+        )
+    
     @staticmethod
     def get_game(game_id):
         """Get a game by ID"""
-        return Game.query.get(game_id)
+        return GameService._with_players(Game.query).get(game_id)
     
     @staticmethod
     def get_active_games_for_user(user_id):
         """Get all active games for a user"""
-        return Game.query.filter(
+        return GameService._with_players(Game.query).filter(
             ((Game.white_player_id == user_id) | (Game.black_player_id == user_id)) &
             (Game.status == 'active')
         ).all()
@@ -48,10 +80,118 @@ class GameService:
     @staticmethod
     def get_completed_games_for_user(user_id, limit=10):
         """Get completed games for a user"""
-        return Game.query.filter(
-            ((Game.white_player_id == user_id) | (Game.black_player_id == user_id)) &
-            (Game.status != 'active')
-        ).order_by(Game.end_time.desc()).limit(limit).all()
+        games, _ = GameService.get_game_history_page(user_id, limit=limit)
+        return games
+    
+    @staticmethod
+    def encode_history_cursor(game):
+        """Encode the (end_time, id) position of a game as an opaque cursor"""
+        raw = f"{game.end_time.isoformat()}|{game.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @staticmethod
+    def decode_history_cursor(cursor):
+        """
+        Decode a cursor produced by encode_history_cursor
+        Returns (end_time, game_id), raises ValueError for a malformed cursor
+        """
+        try:
+            end_time, game_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(end_time), int(game_id)
+        except (ValueError, UnicodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+    
+    @staticmethod
+    def get_game_history_page(user_id, cursor=None, limit=10):
+        """
+        Get a page of completed games for a user, newest first
+        Returns (games, next_cursor) where next_cursor is None on the last page
+        """
+        after = GameService.decode_history_cursor(cursor) if cursor else None
+        
+        # One keyset query per player column so each walks its own index
+        # instead of an OR across both columns
+        def side(player_column):
+            query = GameService._with_players(Game.query).filter(
+                player_column == user_id,
+                Game.end_time.isnot(None),
+                Game.status != 'active'
+            )
+            if after:
+                query = query.filter(tuple_(Game.end_time, Game.id) < after)
+            return query.order_by(Game.end_time.desc(), Game.id.desc()).limit(limit + 1).all()
+        
+        merged = heapq.merge(
+            side(Game.white_player_id),
+            side(Game.black_player_id),
+            key=lambda game: (game.end_time, game.id),
+            reverse=True
+        )
+        games = list(merged)
+        
+        next_cursor = None
+        if len(games) > limit:
+            games = games[:limit]
+            next_cursor = GameService.encode_history_cursor(games[-1])
+        return games, next_cursor
+    
+    @staticmethod
+    def get_moves(game, since=0):
+        """Get the moves of a game after the given ply as dictionaries"""
+        return game.get_move_dicts(since)
+    
+    @staticmethod
+    def explore_position(board, limit=10):
+        """
+        Look a position up in every finished game through the position hash index
+        Returns (moves, games, total): the moves played from the position with their
+        results, the latest games that reached it as (game, ply) pairs and their count
+        """
+        key = position_hash(board)
+        finished = Game.status != 'active'
+        
+        # The move played from the position is stored on the row of the next ply
+        following = aliased(GamePosition)
+        rows = db.session.query(
+            following.move_code,
+            func.count(),
+            func.sum(case((Game.winner_id == Game.white_player_id, 1), else_=0)),
+            func.sum(case((Game.winner_id.is_(None), 1), else_=0)),
+            func.sum(case((Game.winner_id == Game.black_player_id, 1), else_=0))
+        ).select_from(GamePosition).join(
+            following, (following.game_id == GamePosition.game_id) & (following.ply == GamePosition.ply + 1)
+        ).join(Game, Game.id == GamePosition.game_id).filter(
+            GamePosition.position_hash == key,
+            finished
+        ).group_by(following.move_code).order_by(func.count().desc()).all()
+        
+        moves = []
+        for move_code, games_count, white_wins, draws, black_wins in rows:
+            move, _ = decode_move(move_code)
+            if move not in board.legal_moves:
+                continue  # Hash collision with another position
+            moves.append({
+                'uci': move.uci(),
+                'san': board.san(move),
+                'games': games_count,
+                'white_wins': white_wins,
+                'draws': draws,
+                'black_wins': black_wins
+            })
+        
+        reached = db.session.query(GamePosition.game_id, func.min(GamePosition.ply)).join(
+            Game, Game.id == GamePosition.game_id
+        ).filter(
+            GamePosition.position_hash == key,
+            finished
+        ).group_by(GamePosition.game_id)
+        total = reached.count()
+        first_ply = dict(reached.order_by(GamePosition.game_id.desc()).limit(limit).all())
+        
+        games = GameService._with_players(Game.query).filter(
+            Game.id.in_(first_ply)
+        ).order_by(Game.id.desc()).all() if first_ply else []
+        return moves, [(game, first_ply[game.id]) for game in games], total
     
     @staticmethod
     def make_move(game_id, user_id, from_square, to_square, promotion=None):
@@ -70,16 +210,20 @@ class GameService:
         if not game.is_player_turn(user_id):
             return False, "It's not your turn"
         
+        expected_ply = game.ply
         success, error = game.make_move(from_square, to_square, promotion)
         if not success:
             return False, error
         
-        # If game ended, update player ratings
-        if game.status != 'active':
-            GameService._update_player_ratings(game)
+        if not GameService._commit_move(game, expected_ply):
+            return False, "The game changed while your move was being saved, please try again"
         
-        db.session.commit()
-        return True, game.get_game_state()
+        turn_timers.schedule(game)
+        
+        # Build the state once and share it between the response and the subscribers
+        state = game.get_game_state()
+        game_events.publish(game.id, state)
+        return True, state
     
     @staticmethod
     def resign_game(game_id, user_id):
@@ -96,7 +240,13 @@ class GameService:
         # Update player ratings
         GameService._update_player_ratings(game)
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return False, "The game changed while you were resigning, please try again"
+        turn_timers.cancel(game.id)
+        game_events.publish_game(game)
         return True, "Game resigned successfully"
     
     @staticmethod
@@ -124,16 +274,59 @@ class GameService:
             # Update player ratings for draw
             GameService._update_player_ratings(game, is_draw=True)
             
-            db.session.commit()
+            try:
+                db.session.commit()
+            except StaleDataError:
+                db.session.rollback()
+                return False, "The game changed while the draw was being saved, please try again"
+            turn_timers.cancel(game.id)
+            game_events.publish_game(game)
             return True, "Draw accepted due to insufficient material"
         
         return False, "Draw offer saved but not automatically accepted"
     
+    @staticmethod
+    def _commit_move(game, expected_ply):
+        """
+        Commit a move just made on a game, rating the players if it ended the game
+        Returns False (and drops the cached board) if the game moved on from expected_ply first
+        """
+        game_id = game.id
+        try:
+            if game.status != 'active':
+                # If game ended, update player ratings (always committed directly)
+                GameService._update_player_ratings(game, is_draw=game.winner_id is None)
+                db.session.commit()
+            elif move_committer.enabled:
+                # Batched with the moves of other games, returns once committed
+                if not move_committer.commit_move(game, expected_ply):
+                    board_registry.evict(game_id)
+                    return False
+            else:
+                db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            board_registry.evict(game_id)
+            return False
+        except Exception:
+            # The cached board already has the move that wasn't saved
+            db.session.rollback()
+            board_registry.evict(game_id)
+            raise
+        return True
+    
     @staticmethod
     def _update_player_ratings(game, is_draw=False):
         """Update player ratings based on game outcome"""
-        white_player = User.query.get(game.white_player_id)
-        black_player = User.query.get(game.black_player_id)
+        # Fresh rows, locked until the commit: the session may hold players
+        # merged from the user cache, and concurrent games must not both
+        # update from the same old rating
+        players = User.query.filter(
+            User.id.in_((game.white_player_id, game.black_player_id))
+        ).order_by(User.id).populate_existing().with_for_update().all()
+        players = {player.id: player for player in players}
+        white_player = players[game.white_player_id]
+        black_player = players[game.black_player_id]
         
         if is_draw:
             # Draw: 0.5 points for each player
@@ -151,119 +344,54 @@ class GameService:
                 black_player.update_rating(white_player.elo_rating, 1)
                 white_player.battles_lost += 1
                 black_player.battles_won += 1
-    
-    @staticmethod
-    def join_game_queue(user_id):
-        """
-        Add a user to the game queue
-        Returns (was_added_to_queue, opponent_id or None)
-        """
-        # Check if the user is already in queue
-        existing_entry = GameQueue.query.filter_by(user_id=user_id).first()
-        if existing_entry:
-            return False, None
-            
-        # Check if there's a match already waiting
-        match = GameQueue.query.filter(GameQueue.user_id != user_id).order_by(GameQueue.joined_at).first()
-        if match:
-            # Found a match, create a game
-            opponent_id = match.user_id
-            
-            # Remove the opponent from queue
-            db.session.delete(match)
-            db.session.commit()
-            
-            return False, opponent_id
         
-        # No match found, add user to queue
-        queue_entry = GameQueue(user_id=user_id)
-        db.session.add(queue_entry)
-        db.session.commit()
-        
-        return True, None
+        # Keep the leaderboard in step without re-sorting everyone, once the
+        # new ratings are committed
+        for player in (white_player, black_player):
+            after_commit(db.session(), partial(leaderboard.update, player.id, player.elo_rating))
         
+        # Cached copies of both players are out of date now
+        user_cache.invalidate_on_commit(db.session(), white_player.id)
+        user_cache.invalidate_on_commit(db.session(), black_player.id)
+    
     @staticmethod
-    def check_for_match(user_id):
+    def schedule_active_games():
         """
-        Check if there's a match for the user
-        Returns (matched, opponent_id or None)
+        Load the turn deadlines of all active games into the timer scheduler
+        Only needed once at startup, afterwards moves keep the scheduler up to date
         """
-        # Check if user is still in queue
-        queue_entry = GameQueue.query.filter_by(user_id=user_id).first()
-        if not queue_entry:
-            # User was matched previously or removed from queue
-            # Check if they were recently matched by looking for active games
-            from src.models.game import Game  # Ensure Game is imported here
-            
-            recent_game = Game.query.filter(
-                ((Game.white_player_id == user_id) | (Game.black_player_id == user_id)) &
-                (Game.status == 'active')
-            ).order_by(Game.start_time.desc()).first()
-            
-            if recent_game:
-                # Return the opponent's ID
-                opponent_id = recent_game.black_player_id if recent_game.white_player_id == user_id else recent_game.white_player_id
-                return True, opponent_id
-            
-            return False, None
-            
-        # Check for a match
-        match = GameQueue.query.filter(GameQueue.user_id != user_id).order_by(GameQueue.joined_at).first()
-        if match:
-            # Found a match, but don't create a game here
-            # Just mark it as matched so the controller can handle it
-            opponent_id = match.user_id
-            
-            # Ensure one of the players creates the game (the one who joined second)
-            # We'll compare timestamps to decide who creates the game
-            if queue_entry.joined_at > match.joined_at:
-                # This user joined after the opponent, so they should create the game
-                # Don't remove from queue yet - just report the match
-                return True, opponent_id
-            else:
-                # This user joined first, let the other player create the game
-                # Just report a match was found
-                return True, opponent_id
-            
-        # Still waiting
-        return False, None
-        
-    @staticmethod
-    def leave_game_queue(user_id):
-        """Remove a user from the game queue"""
-        queue_entry = GameQueue.query.filter_by(user_id=user_id).first()
-        if queue_entry:
-            db.session.delete(queue_entry)
-            db.session.commit()
-            return True
-        return False
-        
-    @staticmethod
-    def get_queue_status(user_id):
-        """Get user's queue status and position"""
-        queue_entry = GameQueue.query.filter_by(user_id=user_id).first()
-        if not queue_entry:
-            return False, None
-            
-        position = GameQueue.get_queue_position(user_id)
-        return True, position
+        turn_timers.clear()
+        for game in Game.query.filter_by(status='active').all():
+            turn_timers.schedule(game)
+        return len(turn_timers)
     
     @staticmethod
     def check_expired_timers():
         """
-        Check all active games for expired timers and make random moves if necessary
+        Check games whose turn deadline has passed and make random moves if necessary
         Returns a list of game_ids that had random moves made
         """
         games_with_random_moves = []
         
-        # Get all active games
-        active_games = Game.query.filter_by(status='active').all()
+        # Only games with a due deadline are loaded
+        due_game_ids = turn_timers.pop_due()
+        if not due_game_ids:
+            return games_with_random_moves
         
-        for game in active_games:
-            if game.check_time_limit():
+        due_games = Game.query.filter(Game.id.in_(due_game_ids), Game.status == 'active').all()
+        
+        for game in due_games:
+            # Committed one game at a time, on the same ply check as player moves
+            expected_ply = game.ply
+            if game.check_time_limit() and GameService._commit_move(game, expected_ply):
                 games_with_random_moves.append(game.id)
-                
-        if games_with_random_moves:
-            db.session.commit()
+        
+        for game in due_games:
+            # Picks up the new deadline after a random move, or the real one
+            # if the game was moved on by someone else in the meantime
+            turn_timers.schedule(game)
+            
+            if game.id in games_with_random_moves:
+                game_events.publish_game(game)
             
-        return games_with_random_moves 
\ No newline at end of file
+        return games_with_random_moves
\ No newline at end of file
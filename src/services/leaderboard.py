@@ -0,0 +1,91 @@
+from bisect import bisect_left, insort
+import threading
+
+from src.models.user import User, db
+
+
+class Leaderboard:
+    """
+    In-memory rating index of all players, built from the User table once.
+
+    Players are sorted by (-rating, user_id), so a rank is a bisection and
+    pages are served without touching the database. Players with the same
+    rating share a rank.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = []  # sorted (-rating, user_id) tuples
+        self._ratings = {}  # user_id -> rating
+        self._usernames = {}  # user_id -> username
+        self._loaded = False
+
+    def load(self):
+        """(Re)build the index from the User table"""
+        rows = db.session.query(User.id, User.username, User.elo_rating).all()
+
+        with self._lock:
+            self._ratings = {user_id: rating or 0 for user_id, _, rating in rows}
+            self._usernames = {user_id: username for user_id, username, _ in rows}
+            self._index = sorted((-rating, user_id) for user_id, rating in self._ratings.items())
+            self._loaded = True
+        return len(rows)
+
+    def add(self, user):
+        """Add a newly registered user"""
+        self.update(user.id, user.elo_rating, user.username)
+
+    def update(self, user_id, rating, username=None):
+        """Move a player to their new rating, O(log n) search plus a list shift"""
+        if not self._loaded:
+            return  # The first read loads the current ratings anyway
+
+        with self._lock:
+            old_rating = self._ratings.get(user_id)
+            if old_rating is not None:
+                del self._index[bisect_left(self._index, (-old_rating, user_id))]
+            self._ratings[user_id] = rating or 0
+            if username is not None:
+                self._usernames[user_id] = username
+            insort(self._index, (-self._ratings[user_id], user_id))
+
+    def rank(self, user_id):
+        """Get the 1-based rank of a player, or None if they aren't ranked"""
+        self._ensure_loaded()
+        with self._lock:
+            rating = self._ratings.get(user_id)
+            if rating is None:
+                return None
+            return self._rank_of(rating)
+
+    def page(self, page=1, per_page=20):
+        """Get one page of players, best rated first, as (players, total)"""
+        self._ensure_loaded()
+        start = (page - 1) * per_page
+        with self._lock:
+            players = [
+                {
+                    "rank": self._rank_of(-negative_rating),
+                    "id": user_id,
+                    "username": self._usernames.get(user_id),
+                    "elo_rating": -negative_rating
+                }
+                for negative_rating, user_id in self._index[start:start + per_page]
+            ]
+            return players, len(self._index)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def _rank_of(self, rating):
+        """Rank of a rating: players rated strictly higher plus one, caller holds the lock"""
+        return bisect_left(self._index, (-rating,)) + 1
+
+
+# Shared leaderboard for the whole process
+leaderboard = Leaderboard()
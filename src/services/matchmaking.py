@@ -0,0 +1,413 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+import threading
+import time
+
+from src.models.user import User, db
+from src.models.game_queue import GameQueue
+from src.services.game_service import GameService
+from src.services.presence import presence
+
+
+class ArrivalIndex:
+    """
+    Fenwick tree over arrival numbers, counts how many queued players arrived
+    at or before a given arrival in O(log n)
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._tree = [0] * (capacity + 1)
+
+    def clear(self):
+        """Remove everyone, back to the initial capacity"""
+        self._tree = [0] * (self.capacity + 1)
+
+    def reset(self, count):
+        """Start over with arrivals 1 to count all present"""
+        self.clear()
+        for seq in range(1, count + 1):
+            self.add(seq, 1)
+
+    def add(self, seq, delta):
+        """Add delta to the count at arrival number seq (1-based)"""
+        if seq >= len(self._tree):
+            self._grow(seq)
+        while seq < len(self._tree):
+            self._tree[seq] += delta
+            seq += seq & -seq
+
+    def rank(self, seq):
+        """Count the queued players with an arrival number <= seq"""
+        seq = min(seq, len(self._tree) - 1)
+        total = 0
+        while seq > 0:
+            total += self._tree[seq]
+            seq -= seq & -seq
+        return total
+
+    def _grow(self, seq):
+        """Double the capacity until seq fits, rebuilding the tree from its counts"""
+        size = len(self._tree) - 1
+        counts = [self.rank(i) - self.rank(i - 1) for i in range(1, size + 1)]
+        while size < seq:
+            size *= 2
+        self._tree = [0] * (size + 1)
+        for i, count in enumerate(counts, start=1):
+            if count:
+                self.add(i, count)
+
+
+class QueueEntry:
+    """A player waiting in the matchmaking queue"""
+
+    __slots__ = ('user_id', 'rating', 'joined_at', 'seq')
+
+    def __init__(self, user_id, rating, seq, joined_at=None):
+        self.user_id = user_id
+        self.rating = rating
+        self.seq = seq  # Arrival order, breaks rating ties in favour of the longest waiting
+        self.joined_at = joined_at or datetime.utcnow()
+
+    @property
+    def key(self):
+        """Position of the entry in the rating index"""
+        return (self.rating, self.seq, self.user_id)
+
+
+class Matchmaker:
+    """
+    In-memory, rating-aware matchmaking queue.
+
+    Waiting players are kept sorted by Elo rating and paired with the nearest
+    online neighbour whose rating fits either player's search window, which
+    widens while they wait. Pairing happens under one lock, so each pair gets
+    exactly one game; the GameQueue table only mirrors the queue for restarts.
+    The queue is per process, run a single worker when matchmaking is in use.
+    """
+
+    # Placeholder stored for a player whose game is being created
+    PENDING = object()
+
+    def __init__(self, base_window=100, window_growth=10, max_window=600, widen_interval=2):
+        self.base_window = base_window
+        self.window_growth = window_growth
+        self.max_window = max_window
+        self.widen_interval = widen_interval
+
+        self._lock = threading.Lock()
+        self._queue = {}  # user_id -> QueueEntry
+        self._by_rating = []  # sorted QueueEntry.key tuples
+        self._seq = 0
+        self._arrivals = ArrivalIndex()
+        self._matches = {}  # user_id -> match waiting to be picked up (or PENDING)
+        self._signals = {}  # user_id -> threading.Event set when the queue state settles
+
+    def restore(self):
+        """Reload the waiting players from the GameQueue table"""
+        rows = db.session.query(GameQueue, User).join(
+            User, User.id == GameQueue.user_id
+        ).order_by(GameQueue.joined_at).all()
+
+        with self._lock:
+            self._queue.clear()
+            self._by_rating = []
+            self._seq = 0
+            self._arrivals.clear()
+            self._matches.clear()
+            self._signals.clear()
+            for queue_entry, user in rows:
+                entry = QueueEntry(queue_entry.user_id, user.elo_rating, self._next_seq(), queue_entry.joined_at)
+                self._add(entry)
+                self._signals[entry.user_id] = threading.Event()
+        
+        # Give restored players the usual grace period to reconnect
+        for _, user in rows:
+            presence.touch(user)
+        return len(rows)
+
+    def join(self, user_id, rating):
+        """
+        Add a user to the queue or pair them with a waiting player of similar rating
+        Returns (status, match) where status is 'queued', 'already_queued' or 'matched',
+        the match is only set when a game was created
+        """
+        stale = []
+        with self._lock:
+            if user_id in self._queue or user_id in self._matches:
+                return 'already_queued', None
+
+            entry = QueueEntry(user_id, rating, self._next_seq())
+            opponent = self._find_opponent(entry, datetime.utcnow(), stale)
+            if opponent is None:
+                self._add(entry)
+                self._signals[user_id] = threading.Event()
+            else:
+                # Reserve the opponent's slot until the game exists
+                self._remove(opponent)
+                self._matches[opponent.user_id] = self.PENDING
+
+        self._forget(stale)
+        if opponent is None:
+            self._persist_join(entry)
+            return 'queued', None
+
+        return 'matched', self._complete_match(entry, opponent)
+
+    def poll(self, user_id):
+        """
+        Check the queue state of a user without touching the database
+        Returns (status, match) where status is 'matched', 'matching', 'waiting' or 'not_in_queue'
+        """
+        with self._lock:
+            match = self._matches.get(user_id)
+            if match is self.PENDING:
+                return 'matching', None
+            if match is not None:
+                del self._matches[user_id]
+                self._signals.pop(user_id, None)
+                return 'matched', match
+            if user_id in self._queue:
+                return 'waiting', None
+            self._signals.pop(user_id, None)
+            return 'not_in_queue', None
+
+    def wait_for_match(self, user_id, timeout):
+        """
+        Block until the user is matched or leaves the queue, or the timeout expires
+        While waiting the user's own search window keeps widening
+        Returns the same (status, match) pair as poll()
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            # A player waiting on the long poll is still connected
+            presence.heartbeat(user_id)
+            status, match = self.poll(user_id)
+            if status == 'waiting':
+                match = self._pair_waiting(user_id)
+                if match is not None:
+                    return 'matched', match
+            elif status != 'matching':
+                return status, match
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return status, None
+
+            with self._lock:
+                signal = self._signals.get(user_id)
+            if signal is None:
+                return self.poll(user_id)
+            signal.wait(min(remaining, self.widen_interval))
+
+    def position(self, user_id):
+        """Get the 1-based position of a user in the queue by arrival, or None"""
+        with self._lock:
+            entry = self._queue.get(user_id)
+            if entry is None:
+                return None
+            return self._arrivals.rank(entry.seq)
+
+    def leave(self, user_id):
+        """Remove a user from the queue, returns whether they were queued"""
+        with self._lock:
+            entry = self._queue.get(user_id)
+            if entry is not None:
+                self._remove(entry)
+            if self._matches.get(user_id) is not self.PENDING:
+                self._matches.pop(user_id, None)
+                self._notify(user_id)
+                self._signals.pop(user_id, None)
+
+        if entry is None:
+            return False
+
+        GameQueue.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+        return True
+
+    def window(self, entry, now):
+        """Get the rating difference a waiting player currently accepts"""
+        waited = max((now - entry.joined_at).total_seconds(), 0)
+        return min(self.base_window + self.window_growth * waited, self.max_window)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._queue)
+
+    def _next_seq(self):
+        """Hand out the next arrival number, caller holds the lock"""
+        if not self._queue:
+            # Nobody is waiting, start numbering arrivals from scratch
+            self._seq = 0
+            self._arrivals.clear()
+        elif self._seq >= max(2 * len(self._queue), self._arrivals.capacity) and not self._reserved():
+            self._compact()
+        self._seq += 1
+        return self._seq
+
+    def _compact(self):
+        """
+        Renumber the waiting players 1..n in arrival order, caller holds the lock
+        Keeps arrival numbers (and the ArrivalIndex) bounded when the queue never drains
+        """
+        entries = sorted(self._queue.values(), key=lambda entry: entry.seq)
+        for seq, entry in enumerate(entries, start=1):
+            entry.seq = seq
+        self._by_rating = sorted(entry.key for entry in entries)
+        self._arrivals.reset(len(entries))
+        self._seq = len(entries)
+
+    def _reserved(self):
+        """Whether a pair is being matched, caller holds the lock"""
+        # Their entries go back into the queue with their old number if the match fails
+        return any(match is self.PENDING for match in self._matches.values())
+
+    def _add(self, entry):
+        """Insert an entry into the queue and the rating index, caller holds the lock"""
+        self._queue[entry.user_id] = entry
+        insort(self._by_rating, entry.key)
+        self._arrivals.add(entry.seq, 1)
+
+    def _remove(self, entry):
+        """Remove an entry from the queue and the rating index, caller holds the lock"""
+        del self._queue[entry.user_id]
+        index = bisect_left(self._by_rating, entry.key)
+        del self._by_rating[index]
+        self._arrivals.add(entry.seq, -1)
+
+    def _find_opponent(self, entry, now, stale):
+        """
+        Find the closest rated online player whose rating fits either search window
+        O(log n): only the two online rating neighbours can be the closest.
+        Offline neighbours are taken off the queue and added to stale. Caller holds the lock
+        """
+        best = None
+        for candidate in (self._online_neighbour(entry, -1, stale), self._online_neighbour(entry, 1, stale)):
+            if candidate is None:
+                continue
+            difference = abs(candidate.rating - entry.rating)
+            if difference > max(self.window(entry, now), self.window(candidate, now)):
+                continue
+            if best is None or (difference, candidate.seq) < (abs(best.rating - entry.rating), best.seq):
+                best = candidate
+        return best
+
+    def _online_neighbour(self, entry, step, stale):
+        """
+        Get the nearest online waiting player below (step -1) or above (step 1) an entry
+        Offline players passed on the way are removed and added to stale. Caller holds the lock
+        """
+        index = bisect_left(self._by_rating, entry.key)
+        if step > 0 and index < len(self._by_rating) and self._by_rating[index][2] == entry.user_id:
+            index += 1  # The entry itself is queued, skip it
+        elif step < 0:
+            index -= 1
+
+        while 0 <= index < len(self._by_rating):
+            candidate = self._queue[self._by_rating[index][2]]
+            if presence.is_online(candidate.user_id):
+                return candidate
+            self._remove(candidate)
+            self._notify(candidate.user_id)
+            self._signals.pop(candidate.user_id, None)
+            stale.append(candidate)
+            if step < 0:
+                index -= 1  # Going down, the next candidate is just below
+            # Going up, removing the candidate moved the next one into this index
+        return None
+
+    def _pair_waiting(self, user_id):
+        """Retry pairing a waiting player with their current window, returns their match or None"""
+        stale = []
+        with self._lock:
+            entry = self._queue.get(user_id)
+            if entry is None:
+                return None
+            opponent = self._find_opponent(entry, datetime.utcnow(), stale)
+            if opponent is not None:
+                self._remove(entry)
+                self._remove(opponent)
+                self._matches[user_id] = self.PENDING
+                self._matches[opponent.user_id] = self.PENDING
+
+        self._forget(stale)
+        if opponent is None:
+            return None
+
+        try:
+            match = self._complete_match(entry, opponent)
+        except Exception:
+            with self._lock:
+                self._matches.pop(user_id, None)
+                self._add(entry)
+            raise
+
+        with self._lock:
+            self._matches.pop(user_id, None)
+            self._signals.pop(user_id, None)
+        return match
+
+    def _complete_match(self, entry, opponent):
+        """Create the game for a reserved pair and hand it to the opponent"""
+        try:
+            match = self._create_match(entry.user_id, opponent.user_id)
+        except Exception:
+            # Put the opponent back, they keep their place
+            with self._lock:
+                self._matches.pop(opponent.user_id, None)
+                self._add(opponent)
+            raise
+
+        with self._lock:
+            self._matches[opponent.user_id] = match
+            self._notify(opponent.user_id)
+        return match
+
+    def _notify(self, user_id):
+        """Wake up a long-polling player, caller holds the lock"""
+        signal = self._signals.get(user_id)
+        if signal is not None:
+            signal.set()
+
+    def _forget(self, stale):
+        """Delete the GameQueue rows of players dropped from the queue for being offline"""
+        if not stale:
+            return
+        GameQueue.query.filter(
+            GameQueue.user_id.in_([entry.user_id for entry in stale])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    def _persist_join(self, entry):
+        """
+        Mirror a new queue entry in the GameQueue table
+        The row is written after the lock is released, so the entry may have been
+        paired or have left in the meantime, with nothing to delete yet; take the
+        row back out then, or it would be restored as a waiting player
+        """
+        GameQueue.query.filter_by(user_id=entry.user_id).delete()
+        db.session.add(GameQueue(user_id=entry.user_id, joined_at=entry.joined_at))
+        db.session.commit()
+
+        with self._lock:
+            queued = self._queue.get(entry.user_id) is entry
+        if not queued:
+            GameQueue.query.filter_by(user_id=entry.user_id, joined_at=entry.joined_at).delete()
+            db.session.commit()
+
+    @staticmethod
+    def _create_match(user_id, opponent_id):
+        """Create the game for a pair and describe it for both players"""
+        GameQueue.query.filter(GameQueue.user_id.in_([user_id, opponent_id])).delete(synchronize_session=False)
+        game = GameService.create_game(user_id, opponent_id)
+        return {
+            "id": game.id,
+            "white_player_id": game.white_player_id,
+            "white_player": game.white_player.username,
+            "black_player": game.black_player.username
+        }
+
+
+# Shared matchmaker for the whole process
+matchmaker = Matchmaker()
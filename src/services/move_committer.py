@@ -0,0 +1,204 @@
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import inspect
+
+from src.models.user import db
+from src.models.game import Game
+from src.models.move_log import GameMoveLog
+
+
+class PendingMove:
+    """A move write waiting for the committer, the caller waits on `done`"""
+
+    __slots__ = (
+        'game_id', 'expected_ply', 'changes', 'log_changes', 'inserts',
+        'done', 'accepted', 'error', 'started', 'cancelled'
+    )
+
+    def __init__(self, game_id, expected_ply, changes, log_changes, inserts):
+        self.game_id = game_id
+        self.expected_ply = expected_ply
+        self.changes = changes  # Game columns to update
+        self.log_changes = log_changes  # GameMoveLog columns to update, for packed games
+        self.inserts = inserts  # (table, values) of new rows, e.g. ChessMove rows
+        self.done = threading.Event()
+        self.accepted = False
+        self.error = None
+        self.started = False  # Taken into a batch, the outcome is only known once it's written
+        self.cancelled = False  # Given up on by the caller before it was taken
+
+
+class MoveCommitter:
+    """
+    Group commit for move writes.
+
+    Instead of committing its own transaction, a move request hands its
+    changes to a single committer thread and waits. The committer collects
+    the writes that arrive within `interval` seconds (up to max_batch), applies
+    them in one transaction and commits once, then wakes every waiting caller,
+    so a request only returns after its move is committed. With many
+    concurrent games one commit (and one fsync) covers many moves.
+
+    Every game update is conditional on the ply the move was made from
+    (UPDATE ... WHERE ply = expected), a write whose game moved on in the
+    meantime is rejected rather than overwriting the newer move. A caller that
+    times out cancels its write if the committer hasn't taken it yet, and
+    otherwise waits for the outcome, so a failed move is never saved later.
+    Disabled by default, see MOVE_GROUP_COMMIT in app.py.
+    """
+
+    def __init__(self, enabled=False, interval=0.005, max_batch=256, timeout=10):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._app = None
+        self.configure(enabled, interval, max_batch, timeout)
+
+        self.batches = 0
+        self.writes = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def configure(self, enabled=False, interval=0.005, max_batch=256, timeout=10):
+        """Switch group commit on or off and set the batching window"""
+        self.enabled = enabled
+        self.interval = interval
+        self.max_batch = max_batch
+        self.timeout = timeout
+
+    def commit_move(self, game, expected_ply):
+        """
+        Write the pending changes of a game and its new move through the committer
+        The session's own changes are rolled back, the write happens on the committer's
+        connection. Blocks until committed, returns False if the game moved on first
+        """
+        game_id = game.id
+        changes = self._changed_columns(game)
+        log_changes = {}
+        if game.packed_moves and game.move_log in db.session.dirty:
+            log_changes = self._changed_columns(game.move_log)
+        inserts = [
+            (
+                row.__table__,
+                {
+                    column.name: getattr(row, column.key)
+                    for column in row.__table__.columns
+                    if getattr(row, column.key) is not None
+                }
+            )
+            for row in db.session.new
+            if getattr(row, 'game_id', None) == game_id
+        ]
+        # Nothing of this goes through the session, and its connection isn't held while waiting
+        db.session.rollback()
+
+        pending = PendingMove(game_id, expected_ply, changes, log_changes, inserts)
+        self._start()
+        self._queue.put(pending)
+
+        if not pending.done.wait(self.timeout):
+            with self._lock:
+                if not pending.started:
+                    pending.cancelled = True
+                    self.cancelled += 1
+            if pending.cancelled:
+                raise RuntimeError(f"Move for game {game_id} was not committed within {self.timeout}s")
+            # Already being written, the commit is about to succeed or fail
+            pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.accepted
+
+    def stats(self):
+        """Return batch and write counters"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'batches': self.batches,
+                'writes': self.writes,
+                'rejected': self.rejected,
+                'cancelled': self.cancelled,
+                'avg_batch': self.writes / self.batches if self.batches else 0.0,
+                'queued': self._queue.qsize()
+            }
+
+    @staticmethod
+    def _changed_columns(instance):
+        """Map the changed columns of a loaded instance to their new values"""
+        state = inspect(instance)
+        return {
+            prop.columns[0].name: getattr(instance, prop.key)
+            for prop in state.mapper.column_attrs
+            if state.attrs[prop.key].history.has_changes()
+        }
+
+    def _start(self):
+        """Start the committer thread on first use, bound to the current app"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._app = current_app._get_current_object()
+            self._thread = threading.Thread(target=self._run, name='move-committer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        """Apply a batch of move writes in one transaction and wake their callers"""
+        with self._lock:
+            batch = [pending for pending in batch if not pending.cancelled]
+            for pending in batch:
+                pending.started = True
+        if not batch:
+            return
+
+        games = Game.__table__
+        logs = GameMoveLog.__table__
+        try:
+            with self._app.app_context():
+                with db.get_engine(self._app).begin() as connection:
+                    for pending in batch:
+                        result = connection.execute(
+                            games.update().where(
+                                games.c.id == pending.game_id,
+                                games.c.ply == pending.expected_ply
+                            ).values(**pending.changes)
+                        )
+                        pending.accepted = result.rowcount == 1
+                        if pending.accepted:
+                            if pending.log_changes:
+                                connection.execute(
+                                    logs.update().where(logs.c.game_id == pending.game_id).values(**pending.log_changes)
+                                )
+                            for table, values in pending.inserts:
+                                connection.execute(table.insert().values(**values))
+        except Exception as e:
+            for pending in batch:
+                pending.accepted = False
+                pending.error = e
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.writes += len(batch)
+                self.rejected += sum(1 for pending in batch if not pending.accepted)
+            for pending in batch:
+                pending.done.set()
+
+
+# Shared committer for the whole process
+move_committer = MoveCommitter()
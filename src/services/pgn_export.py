@@ -0,0 +1,135 @@
+import heapq
+import textwrap
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import aliased
+
+from src.models.user import User, db
+from src.models.game import Game, ChessMove
+from src.models.move_log import GameMoveLog, RANDOM_MOVE_NOTE, replay_notations
+from src.utils.storage import read_only
+
+
+class PgnExporter:
+    """
+    Streams a player's finished games as PGN.
+
+    Games are read oldest first in keyset pages of `batch_size` on (end_time,
+    id), through the per-player history indexes, as plain column rows. The
+    moves of a page are read in one query per storage kind: the SAN of row
+    stored games, the code blobs of packed games (replayed without going
+    through the shared decoder cache). Only one page is held at a time, so
+    memory doesn't grow with the number of games and the first game is sent
+    as soon as the first page is read.
+    """
+
+    def __init__(self, batch_size=200):
+        self.batch_size = batch_size
+
+    def stream(self, user_id, opponent_id=None):
+        """Yield the PGN of every finished game of a user, optionally only those against one opponent"""
+        after = None
+        with read_only():
+            while True:
+                games = self._games_after(user_id, opponent_id, after)
+                if not games:
+                    return
+                moves = self._moves_of(games)
+                for game in games:
+                    yield self.format_game(game, moves.get(game.id, []))
+                after = (games[-1].end_time, games[-1].id)
+
+    @staticmethod
+    def format_game(game, moves):
+        """Build the PGN text of a game row from its (SAN, note) moves"""
+        if game.winner_id is None:
+            result = '1/2-1/2'
+        elif game.winner_id == game.white_player_id:
+            result = '1-0'
+        else:
+            result = '0-1'
+
+        tags = [
+            ('Event', f'Chesster game #{game.id}'),
+            ('Site', 'Chesster'),
+            ('Date', game.start_time.strftime('%Y.%m.%d') if game.start_time else '????.??.??'),
+            ('Round', '-'),
+            ('White', game.white_username),
+            ('Black', game.black_username),
+            ('Result', result)
+        ]
+        header = ''.join(
+            '[{} "{}"]\n'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+            for name, value in tags
+        )
+
+        tokens = []
+        for index, (san, note) in enumerate(moves):
+            if index % 2 == 0:
+                tokens.append(f'{index // 2 + 1}.')
+            tokens.append(san)
+            if note:
+                tokens.append(f'{{{note}}}')
+        tokens.append(result)
+        # PGN export format keeps lines under 80 characters
+        movetext = textwrap.fill(' '.join(tokens), width=79, break_long_words=False, break_on_hyphens=False)
+        return f'{header}\n{movetext}\n\n'
+
+    def _games_after(self, user_id, opponent_id, after):
+        """Get the next page of finished games as column rows, oldest first"""
+        white, black = aliased(User), aliased(User)
+
+        # One keyset query per player column so each walks its own history index
+        def side(player_column, opponent_column):
+            query = db.session.query(
+                Game.id, Game.end_time, Game.start_time, Game.winner_id,
+                Game.white_player_id, Game.packed_moves,
+                white.username.label('white_username'), black.username.label('black_username')
+            ).join(white, white.id == Game.white_player_id).join(black, black.id == Game.black_player_id).filter(
+                player_column == user_id,
+                Game.end_time.isnot(None),
+                Game.status != 'active'
+            )
+            if opponent_id is not None:
+                query = query.filter(opponent_column == opponent_id)
+            if after:
+                query = query.filter(tuple_(Game.end_time, Game.id) > after)
+            return query.order_by(Game.end_time, Game.id).limit(self.batch_size).all()
+
+        merged = heapq.merge(
+            side(Game.white_player_id, Game.black_player_id),
+            side(Game.black_player_id, Game.white_player_id),
+            key=lambda game: (game.end_time, game.id)
+        )
+        return list(merged)[:self.batch_size]
+
+    @staticmethod
+    def _moves_of(games):
+        """Map the id of every game in a page to its (SAN, note) moves"""
+        moves = {}
+
+        row_ids = [game.id for game in games if not game.packed_moves]
+        if row_ids:
+            rows = db.session.query(ChessMove.game_id, ChessMove.move_notation).filter(
+                ChessMove.game_id.in_(row_ids)
+            ).order_by(ChessMove.game_id, ChessMove.ply)
+            for game_id, notation in rows:
+                # Notes are stored as "SAN (note)"
+                san, _, note = notation.partition(' (')
+                moves.setdefault(game_id, []).append((san, note[:-1] or None))
+
+        packed_ids = [game.id for game in games if game.packed_moves]
+        if packed_ids:
+            logs = db.session.query(GameMoveLog.game_id, GameMoveLog.codes).filter(
+                GameMoveLog.game_id.in_(packed_ids)
+            )
+            for game_id, codes in logs:
+                moves[game_id] = [
+                    (san, RANDOM_MOVE_NOTE if random_move else None)
+                    for san, random_move in replay_notations(codes)
+                ]
+        return moves
+
+
+# Shared exporter for the whole process
+pgn_exporter = PgnExporter()
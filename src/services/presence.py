@@ -0,0 +1,129 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+import threading
+import time
+
+
+class PresenceIndex:
+    """
+    In-memory index of the players who are online right now.
+
+    A player is online for `timeout` seconds after their last heartbeat: any
+    authenticated request, SSE keepalive or matchmaking long poll. Each online
+    player keeps a snapshot taken from their last request, and usernames are
+    kept sorted for prefix search.
+    """
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._last_seen = OrderedDict()  # user_id -> monotonic time, oldest first
+        self._players = {}  # user_id -> snapshot dict
+        self._by_username = []  # sorted (username, user_id) of online players
+
+    def touch(self, user):
+        """Record a heartbeat from a user and refresh their snapshot"""
+        snapshot = {
+            "id": user.id,
+            "username": user.username,
+            "elo_rating": user.elo_rating,
+            "battles_won": user.battles_won,
+            "battles_lost": user.battles_lost
+        }
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            if user.id not in self._players:
+                insort(self._by_username, (user.username, user.id))
+            self._players[user.id] = snapshot
+            self._last_seen[user.id] = now
+            self._last_seen.move_to_end(user.id)
+
+    def heartbeat(self, user_id):
+        """Keep an online user online, for long-lived requests that only know the user id"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if user_id in self._last_seen:
+                self._last_seen[user_id] = now
+                self._last_seen.move_to_end(user_id)
+
+    def remove(self, user_id):
+        """Take a user offline right away, e.g. on logout"""
+        with self._lock:
+            self._drop(user_id)
+
+    def clear(self):
+        """Take everyone offline"""
+        with self._lock:
+            self._last_seen.clear()
+            self._players.clear()
+            self._by_username = []
+
+    def is_online(self, user_id):
+        """Check whether a user sent a heartbeat within the timeout"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return user_id in self._last_seen
+
+    def search(self, prefix='', min_rating=None, max_rating=None, cursor=None, limit=20, exclude=None):
+        """
+        Get a page of online players ordered by username, optionally filtered by a
+        username prefix and a rating range. The cursor is the username the previous
+        page ended with, exclude is a user id to leave out (the caller).
+        Returns (players, next_cursor) with players as read-only dicts
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+
+            start = bisect_left(self._by_username, (prefix,))
+            if cursor:
+                start = max(start, bisect_right(self._by_username, (cursor, float('inf'))))
+
+            players = []
+            for index in range(start, len(self._by_username)):
+                username, user_id = self._by_username[index]
+                if not username.startswith(prefix):
+                    break
+                if user_id == exclude:
+                    continue
+                player = self._players[user_id]
+                if min_rating is not None and player["elo_rating"] < min_rating:
+                    continue
+                if max_rating is not None and player["elo_rating"] > max_rating:
+                    continue
+                players.append(player)
+                if len(players) > limit:
+                    break
+
+        next_cursor = None
+        if len(players) > limit:
+            players = players[:limit]
+            next_cursor = players[-1]["username"]
+        return players, next_cursor
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._last_seen)
+
+    def _expire(self, now):
+        """Drop the players whose last heartbeat is too old, caller holds the lock"""
+        while self._last_seen:
+            user_id, seen = next(iter(self._last_seen.items()))
+            if now - seen <= self.timeout:
+                break
+            self._drop(user_id)
+
+    def _drop(self, user_id):
+        """Remove a player from every structure, caller holds the lock"""
+        self._last_seen.pop(user_id, None)
+        player = self._players.pop(user_id, None)
+        if player is not None:
+            index = bisect_left(self._by_username, (player["username"], user_id))
+            del self._by_username[index]
+
+
+# Shared presence index for the whole process
+presence = PresenceIndex()
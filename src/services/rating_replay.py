@@ -0,0 +1,151 @@
+"""
+Vectorized rating replay over the full game history.
+
+The functions here work on plain NumPy arrays so they can be used without a
+database: players are referred to by their index into the rating arrays and
+a game is (white index, black index, white score) with the score 1, 0.5 or 0.
+"""
+import numpy as np
+
+# Glicko-2 scale factor between the Glicko and Glicko-2 rating scales
+GLICKO2_SCALE = 173.7178
+
+
+def elo_rounds(white, black):
+    """
+    Split games (in play order) into rounds in which nobody plays twice
+    A game goes one round after the last round of either of its players, so
+    updating each round at once gives the same result as updating game by game.
+    Returns a list of index arrays into the game arrays.
+    """
+    if len(white) == 0:
+        return []
+
+    last_round = {}
+    rounds = np.empty(len(white), dtype=np.int64)
+    for i, (w, b) in enumerate(zip(white.tolist(), black.tolist())):
+        current = max(last_round.get(w, -1), last_round.get(b, -1)) + 1
+        rounds[i] = current
+        last_round[w] = current
+        last_round[b] = current
+
+    order = np.argsort(rounds, kind='stable')
+    boundaries = np.flatnonzero(np.diff(rounds[order])) + 1
+    return np.split(order, boundaries)
+
+
+def expected_score(rating, opponent_rating):
+    """Elo expected score of a player against an opponent"""
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def replay_elo(white, black, white_score, n_players, initial_rating=1200, k_factor=32):
+    """
+    Replay games in order with the same Elo update as User.update_rating
+    (white is updated first, black against white's new rating, ratings truncated to int)
+    Returns an int array of final ratings per player index
+    """
+    ratings = np.full(n_players, initial_rating, dtype=np.float64)
+    black_score = 1 - white_score
+
+    for games in elo_rounds(white, black):
+        w, b = white[games], black[games]
+        white_new = np.trunc(ratings[w] + k_factor * (white_score[games] - expected_score(ratings[w], ratings[b])))
+        black_new = np.trunc(ratings[b] + k_factor * (black_score[games] - expected_score(ratings[b], white_new)))
+        ratings[w] = white_new
+        ratings[b] = black_new
+
+    return ratings.astype(np.int64)
+
+
+def _glicko2_volatility(sigma, phi, v, delta, tau, tolerance=1e-6, max_iterations=100):
+    """Solve the Glicko-2 volatility update for many players at once (Illinois algorithm)"""
+    a = np.log(sigma ** 2)
+
+    def f(x):
+        ex = np.exp(x)
+        return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+    A = a.copy()
+    B = np.where(delta ** 2 > phi ** 2 + v, np.log(np.maximum(delta ** 2 - phi ** 2 - v, 1e-300)), a - tau)
+    # Step B down until f(B) >= 0 where the bracket wasn't found directly
+    need_bracket = delta ** 2 <= phi ** 2 + v
+    for _ in range(max_iterations):
+        step = need_bracket & (f(B) < 0)
+        if not step.any():
+            break
+        B = np.where(step, B - tau, B)
+
+    fA, fB = f(A), f(B)
+    for _ in range(max_iterations):
+        active = np.abs(B - A) > tolerance
+        if not active.any():
+            break
+        with np.errstate(divide='ignore', invalid='ignore'):
+            C = A + (A - B) * fA / (fB - fA)
+        C = np.where(active, C, B)
+        fC = f(C)
+        swap = fC * fB <= 0
+        A = np.where(active & swap, B, A)
+        fA = np.where(active, np.where(swap, fB, fA / 2), fA)
+        B = np.where(active, C, B)
+        fB = np.where(active, fC, fB)
+
+    return np.exp(A / 2)
+
+
+def glicko2_period(mu, phi, sigma, player, opponent, score, tau=0.5):
+    """
+    Apply one Glicko-2 rating period in place (ratings on the Glicko-2 scale)
+    player/opponent/score hold one entry per game per side, scores are from the player's view
+    """
+    g = 1 / np.sqrt(1 + 3 * phi[opponent] ** 2 / np.pi ** 2)
+    expected = 1 / (1 + np.exp(-g * (mu[player] - mu[opponent])))
+
+    information = np.zeros(len(mu))
+    improvement = np.zeros(len(mu))
+    np.add.at(information, player, g ** 2 * expected * (1 - expected))
+    np.add.at(improvement, player, g * (score - expected))
+
+    played = information > 0
+    v = 1 / information[played]
+    delta = v * improvement[played]
+
+    new_sigma = _glicko2_volatility(sigma[played], phi[played], v, delta, tau)
+    phi_star = np.sqrt(phi[played] ** 2 + new_sigma ** 2)
+    new_phi = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+
+    # Players who sat the period out only become less certain
+    phi[~played] = np.sqrt(phi[~played] ** 2 + sigma[~played] ** 2)
+    mu[played] = mu[played] + new_phi ** 2 * improvement[played]
+    phi[played] = new_phi
+    sigma[played] = new_sigma
+
+
+def replay_glicko2(white, black, white_score, period, n_players, initial_rating=1200,
+                   initial_deviation=350, initial_volatility=0.06, tau=0.5):
+    """
+    Replay games grouped into rating periods with Glicko-2
+    period holds the (non-decreasing) rating period number of each game
+    Returns (ratings, deviations, volatilities) arrays per player index
+    """
+    mu = np.zeros(n_players)
+    phi = np.full(n_players, initial_deviation / GLICKO2_SCALE)
+    sigma = np.full(n_players, initial_volatility)
+
+    if len(white):
+        boundaries = np.flatnonzero(np.diff(period)) + 1
+        periods = np.split(np.arange(len(white)), boundaries)
+    else:
+        periods = []
+
+    for games in periods:
+        # Both sides of every game, from each player's point of view
+        player = np.concatenate([white[games], black[games]])
+        opponent = np.concatenate([black[games], white[games]])
+        score = np.concatenate([white_score[games], 1 - white_score[games]])
+        glicko2_period(mu, phi, sigma, player, opponent, score, tau)
+
+    ratings = initial_rating + GLICKO2_SCALE * mu
+    deviations = GLICKO2_SCALE * phi
+    return ratings, deviations, sigma
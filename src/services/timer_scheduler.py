@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import heapq
+import threading
+
+
+class TurnTimerScheduler:
+    """
+    Min-heap of turn deadlines (last_move_time + turn_time_limit) for active games.
+
+    Rescheduling a game pushes a new heap entry and leaves the old one behind;
+    stale entries are recognised by their ply and skipped when they surface,
+    so every operation stays O(log n) and a tick only touches expired games.
+    """
+
+    def __init__(self):
+        self._heap = []  # (deadline, game_id, ply)
+        self._deadlines = {}  # game_id -> (deadline, ply) of the live entry
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def deadline_for(game):
+        """Get the moment the current turn of a game runs out"""
+        return game.last_move_time + timedelta(seconds=game.turn_time_limit)
+
+    def schedule(self, game):
+        """Schedule (or reschedule) the turn timer of a game, finished games are cancelled"""
+        if game.status != 'active':
+            self.cancel(game.id)
+            return
+
+        deadline = self.deadline_for(game)
+        ply = game.ply or 0
+        entry = (deadline, game.id, ply)
+        with self._condition:
+            if self._deadlines.get(game.id) == (deadline, ply):
+                return
+            self._deadlines[game.id] = (deadline, ply)
+            heapq.heappush(self._heap, entry)
+            # Wake the timer thread if this is now the earliest deadline
+            if self._heap[0] is entry:
+                self._condition.notify_all()
+
+    def cancel(self, game_id):
+        """Stop tracking the timer of a game"""
+        with self._condition:
+            self._deadlines.pop(game_id, None)
+
+    def clear(self):
+        """Drop every scheduled timer"""
+        with self._condition:
+            self._heap = []
+            self._deadlines.clear()
+
+    def pop_due(self, now=None):
+        """Remove and return the ids of the games whose deadline has passed"""
+        now = now or datetime.utcnow()
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, game_id, ply = heapq.heappop(self._heap)
+                if self._deadlines.get(game_id) != (deadline, ply):
+                    continue  # Superseded by a later move or cancelled
+                del self._deadlines[game_id]
+                due.append(game_id)
+        return due
+
+    def wait_for_due(self, max_wait=60):
+        """
+        Block until the earliest deadline is due, a new earlier deadline is scheduled,
+        or max_wait seconds pass
+        """
+        with self._condition:
+            # Discard superseded entries so we don't wake up for nothing
+            while self._heap:
+                deadline, game_id, ply = self._heap[0]
+                if self._deadlines.get(game_id) == (deadline, ply):
+                    break
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                self._condition.wait(max_wait)
+                return
+
+            timeout = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            if timeout > 0:
+                self._condition.wait(min(timeout, max_wait))
+
+    def __len__(self):
+        with self._condition:
+            return len(self._deadlines)
+
+
+# Shared scheduler for the whole process
+turn_timers = TurnTimerScheduler()
@@ -0,0 +1,74 @@
+import threading
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.models.user import User, db
+from src.utils.storage import after_commit
+from src.utils.ttl_cache import TTLCache
+
+
+class UserCache:
+    """
+    Short-lived cache of users for the Flask-Login user loader.
+
+    Every authenticated request loads its user, including each game poll.
+    The cache keeps a detached copy of each recently seen user and merges it
+    into the request's session without a SELECT (merge with load=False), so
+    the copy itself is never attached to a session and can be shared between
+    threads. Entries expire after `ttl` seconds and are dropped as soon as a
+    user's rating or record changes.
+
+    A load that read its row before an invalidation must not store it after
+    the invalidation, so every invalidation bumps a counter and a load only
+    fills the cache if the counter didn't move while it was reading.
+    """
+
+    def __init__(self, ttl=30, capacity=1024):
+        self._users = TTLCache(ttl=ttl, capacity=capacity)
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        """Get a session-bound user by id, from the cache when possible"""
+        snapshot = self._users.get(user_id)
+        if snapshot is not None:
+            return db.session.merge(snapshot, load=False)
+
+        invalidations = self._invalidations
+        user = User.query.get(user_id)
+        if user is not None:
+            with self._lock:
+                if invalidations == self._invalidations:
+                    self._users.put(user_id, self._snapshot(user))
+        return user
+
+    def invalidate(self, user_id):
+        """Drop a user whose row changed"""
+        with self._lock:
+            self._invalidations += 1
+            self._users.invalidate(user_id)
+
+    def invalidate_on_commit(self, session, user_id):
+        """
+        Drop a user whose row is changed in the session's transaction
+        Dropped again once it commits, as other requests still read the old row until then
+        """
+        self.invalidate(user_id)
+        after_commit(session, lambda: self.invalidate(user_id))
+
+    def clear(self):
+        self._users.clear()
+
+    def stats(self):
+        return self._users.stats()
+
+    @staticmethod
+    def _snapshot(user):
+        """Copy the column values of a user into a detached instance"""
+        snapshot = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+        make_transient_to_detached(snapshot)
+        return snapshot
+
+
+# Shared user cache for the whole process
+user_cache = UserCache()
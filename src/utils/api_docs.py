@@ -15,6 +15,9 @@ POST /api/auth/login
 - Body: { username, password }
 - Returns: { message, user: { id, username, email, ... } } or { error }
 
+Register and login answer 503 with a Retry-After header when too many
+passwords are already being hashed.
+
 POST /api/auth/logout
 - Logout the current user
 - Returns: { message } or { error }
@@ -33,8 +36,14 @@ POST /api/chess/start-game
 
 GET /api/chess/games/:game_id
 - Get details of a specific game
+- Supports If-None-Match with the returned ETag (304 if the game is unchanged)
 - Returns: { game: {...} } or { error }
 
+GET /api/chess/games/:game_id/events
+- Subscribe to game state changes (Server-Sent Events)
+- Sends the current state on connect, then one `state` event per change
+- Returns: text/event-stream of { ...game state... } or { error }
+
 POST /api/chess/games/:game_id/move
 - Make a move in a chess game
 - Body: { from_square, to_square, promotion?(optional) }
@@ -48,21 +57,64 @@ POST /api/chess/games/:game_id/draw
 - Offer a draw in a chess game
 - Returns: { message } or { error }
 
-GET /api/chess/games/:game_id/moves
-- Get all moves for a specific game
-- Returns: { moves: [...] } or { error }
+GET /api/chess/games/:game_id/moves?since=<ply>
+- Get all moves for a specific game, or only those after the given ply
+- Supports If-None-Match with the returned ETag (304 if no move was made)
+- Moves of games stored in a packed move log have no id (null)
+- Returns: { moves: [...], ply } or { error }
+
+GET /api/chess/games/:game_id/position?ply=<n>
+- Get the board after the given ply (0 is the start position, default the current ply)
+- Rebuilt from the nearest stored checkpoint, a past position never changes so its ETag is stable
+- Returns: { game_id, ply, fen, turn, is_check, last_move: { from_square, to_square } } or { error }
 
 GET /api/chess/active-games
 - Get all active games for the current user
 - Returns: { games: [...] } or { error }
 
-GET /api/chess/game-history
-- Get completed games for the current user
-- Returns: { games: [...] } or { error }
-
-GET /api/chess/available-players
-- Get list of players available for a new game
-- Returns: { players: [...] } or { error }
+GET /api/chess/game-history?cursor=<cursor>&limit=<n>
+- Get completed games for the current user, newest first
+- Pass next_cursor from the previous page to continue (limit defaults to 10, max 50)
+- Returns: { games: [...], next_cursor } or { error }
+
+GET /api/chess/available-players?q=<prefix>&min_rating=<n>&max_rating=<n>&cursor=<cursor>&limit=<n>
+- Get online players available for a new game, ordered by username
+- A player is online for 60 seconds after their last request (SSE keepalives and queue polls count)
+- q matches the start of the username, the rating range is inclusive
+- Pass next_cursor from the previous page to continue (limit defaults to 20, max 50)
+- Returns: { players: [...], next_cursor } or { error }
+
+GET /api/chess/leaderboard?page=<n>&per_page=<n>
+- Get players ranked by Elo rating, best first (per_page defaults to 20, max 100)
+- Players with the same rating share a rank
+- Returns: { players: [{ rank, id, username, elo_rating }], page, per_page, total, me: { rank, elo_rating } }
+
+GET /api/chess/explorer?fen=<fen>&limit=<n>
+- Look a position up in all finished games (limit defaults to 10, max 50)
+- Move counters in the FEN are ignored, transpositions count as the same position
+- Returns: { fen, total_games, moves: [{ uci, san, games, white_wins, draws, black_wins }],
+  games: [{ id, white_player, black_player, winner, status, ply, end_time }] } or { error }
+
+GET /api/chess/export/pgn?user=<username>
+- Download your finished games as PGN, oldest first, streamed as they are read
+- With user, only the games you played against that player
+- Returns: PGN text (application/x-chess-pgn) or { error }
+
+Matchmaking API
+--------------
+
+POST /api/queue/join
+- Join the matchmaking queue, or get matched immediately
+- Only online players are matched, waiting players who go offline are dropped from the queue
+- Returns: { status: queued|already_queued|matched, message, position?, game? }
+
+GET /api/queue/status?timeout=<seconds>
+- Long poll: waits until a match is found or the timeout expires (default and max 25s)
+- Returns: { status: matched|matching|waiting|not_in_queue, message, position?, game? }
+
+POST /api/queue/leave
+- Leave the matchmaking queue
+- Returns: { status, message }
 
 Security Considerations
 ----------------------
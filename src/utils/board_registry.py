@@ -0,0 +1,111 @@
+from collections import Counter
+from contextlib import contextmanager
+import threading
+import chess
+
+from src.utils.lru_cache import LRUCache
+
+
+class LiveBoard:
+    """
+    A cached chess.Board together with the game version (ply) and FEN it represents.
+
+    A board parsed from FEN has no move stack, so repetitions are tracked in
+    a table of position key -> count instead, covering the positions since the
+    last irreversible move. The table starts out as None and is seeded by the
+    caller (see Game._make_move) the first time a move is played on the board.
+    """
+
+    __slots__ = ('board', 'version', 'fen', 'lock', 'repetitions')
+
+    def __init__(self, board, version, fen=None):
+        self.board = board
+        self.version = version
+        self.fen = fen
+        self.lock = threading.RLock()
+        self.repetitions = None
+
+    def seed_repetitions(self, keys):
+        """Fill the repetition table from the keys of the positions since the last irreversible move"""
+        self.repetitions = Counter(keys)
+
+    def push(self, move):
+        """Play a move on the cached board and bump its version, returns whether it was irreversible"""
+        irreversible = self.board.is_irreversible(move)
+        self.board.push(move)
+        self.version += 1
+        self.fen = self.board.fen()
+        if irreversible and self.repetitions is not None:
+            # None of the earlier positions can occur again
+            self.repetitions.clear()
+        return irreversible
+
+    def count_position(self, key):
+        """Count the position just pushed in the repetition table, returns how often it occurred"""
+        self.repetitions[key] += 1
+        return self.repetitions[key]
+
+
+class BoardRegistry:
+    """
+    Process-level LRU registry of live chess.Board objects for active games.
+
+    Entries are keyed by game id and validated against the stored version and
+    FEN of the game. Boards are pushed before the move is committed, so a
+    rolled back move or a move that lost a race leaves a board at the right
+    version but the wrong position; comparing the FEN turns that into a miss
+    and the board is rebuilt from the stored state.
+    """
+
+    def __init__(self, capacity=2048):
+        self._boards = LRUCache(capacity)  # game_id -> LiveBoard
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def checkout(self, game_id, version, fen, cache=True):
+        """
+        Lock and yield the live board of a game at the given version
+        Callers that play a move must do it through LiveBoard.push while holding the board
+        """
+        if not cache or game_id is None:
+            # Finished games are not worth keeping around
+            self.evict(game_id)
+            yield LiveBoard(chess.Board(fen), version, fen)
+            return
+
+        live = self._boards.get_or_add(game_id, lambda: LiveBoard(None, -1))
+        with live.lock:
+            if live.version == version and live.fen == fen:
+                self.hits += 1
+                yield live
+                return
+
+            self.misses += 1
+            if live.version > version:
+                # The caller holds an older snapshot of the game, don't roll the cache back
+                yield LiveBoard(chess.Board(fen), version, fen)
+                return
+
+            live.board = chess.Board(fen)
+            live.version = version
+            live.fen = fen
+            live.repetitions = None
+            yield live
+
+    def evict(self, game_id):
+        """Drop the cached board of a game (e.g. when it ends)"""
+        self._boards.pop(game_id)
+
+    def clear(self):
+        """Drop every cached board"""
+        self._boards.clear()
+
+    def stats(self):
+        """Return cache size and hit/miss counters"""
+        # Hits are boards at the requested version, not just present ones
+        return {'size': len(self._boards), 'capacity': self._boards.capacity, 'hits': self.hits, 'misses': self.misses}
+
+
+# Shared registry for the whole process
+board_registry = BoardRegistry()
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+    """
+    Thread-safe bounded mapping that drops its least recently used entry when full.
+
+    Shared by the process-level caches (positions, boards, TTL caches) so they
+    evict and report hit/miss counters the same way.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for a key, or None on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Cache a value under a key and return it"""
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def get_or_add(self, key, factory):
+        """Return the value for a key, storing factory() first if there is none; not counted as a lookup"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                return self._store(key, factory())
+            self._entries.move_to_end(key)
+            return value
+
+    def pop(self, key):
+        """Drop a single entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return cache size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, value):
+        """Insert an entry and evict the oldest one past capacity, with the lock held"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return value
@@ -0,0 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as ResultTimeout
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import time
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash requests are already waiting for a worker"""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a small process pool.
+
+    Keeps the CPU time of PBKDF2 away from the request workers and caps how
+    many hashes run at once: `workers` run, up to `max_pending` more wait, and
+    the rest (or a request waiting longer than `timeout`) get PasswordHasherBusy.
+    """
+
+    def __init__(self, workers=2, max_pending=32, method='pbkdf2:sha256', salt_length=16, timeout=30):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.configure(workers, max_pending, method, salt_length, timeout)
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.restarts = 0
+        self.total_seconds = 0.0  # Of completed requests only
+
+    def configure(self, workers=2, max_pending=32, method='pbkdf2:sha256', salt_length=16, timeout=30):
+        """Change the pool size and hashing cost, takes effect for new requests"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self.workers = workers
+            self.max_pending = max_pending
+            self.method = method
+            self.salt_length = salt_length
+            self.timeout = timeout
+            self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def stats(self):
+        """Return pool size, queue depth and timing counters"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self.in_flight,
+                'queued': max(self.in_flight - self.workers, 0),
+                'peak_in_flight': self.peak_in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'restarts': self.restarts,
+                'avg_ms': 1000 * self.total_seconds / self.completed if self.completed else 0.0
+            }
+
+    def _run(self, function, *args):
+        """Run a hashing function on the pool, waiting for the result"""
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy("Too many authentication requests, try again shortly")
+
+        started = time.perf_counter()
+        holds_slot = True
+        try:
+            with self._lock:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            for retry in (True, False):
+                executor = self._pool()
+                try:
+                    future = executor.submit(function, *args)
+                    result = future.result(timeout=self.timeout)
+                    break
+                except BrokenProcessPool:
+                    # A worker died (killed, out of memory), start a new pool and try once more
+                    self._discard(executor)
+                    if not retry:
+                        raise
+                except ResultTimeout:
+                    # Drops the request if no worker picked it up yet, otherwise
+                    # the slot is released once the worker is done with it
+                    future.cancel()
+                    holds_slot = False
+                    future.add_done_callback(lambda _: slots.release())
+                    with self._lock:
+                        self.timed_out += 1
+                    raise PasswordHasherBusy("Authentication is taking too long, try again shortly")
+
+            with self._lock:
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - started
+            return result
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            if holds_slot:
+                slots.release()
+
+    def _pool(self):
+        """Get the process pool, started on first use and after a crash"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._mp_context())
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken pool, unless another request already replaced it"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _mp_context():
+        """Start method for the workers, never a plain fork of the app process"""
+        # A fork would copy locks held by other request threads into the worker
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+# Shared hasher for the whole process
+password_hasher = PasswordHasher()
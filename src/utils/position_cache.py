@@ -0,0 +1,44 @@
+from src.utils.lru_cache import LRUCache
+
+
+class PositionCache:
+    """
+    Bounded LRU cache of the data get_game_state derives from a position.
+
+    Entries are keyed by the position part of the FEN (placement, side to move,
+    castling rights and en passant square). The move counters don't change the
+    legal moves, so the same position is shared across games and move numbers.
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, capacity=4096):
+        self._positions = LRUCache(capacity)
+
+    @staticmethod
+    def position_key(fen):
+        """Strip the halfmove clock and fullmove number from a FEN"""
+        return ' '.join(fen.split(' ')[:4])
+
+    def get(self, fen):
+        """Return the cached position data for a FEN, or None on a miss"""
+        return self._positions.get(self.position_key(fen))
+
+    def put(self, fen, board):
+        """Derive the position data from a board, cache it under the FEN and return it"""
+        position = {
+            'is_check': board.is_check(),
+            'legal_moves': [move.uci() for move in board.legal_moves],
+            'piece_map': {str(sq): str(piece) for sq, piece in board.piece_map().items()}
+        }
+        return self._positions.put(self.position_key(fen), position)
+
+    def clear(self):
+        """Drop every cached position and reset the counters"""
+        self._positions.clear()
+
+    def stats(self):
+        return self._positions.stats()
+
+
+# Shared cache for the whole process
+position_cache = PositionCache()
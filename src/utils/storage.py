@@ -0,0 +1,183 @@
+"""
+Database configuration for Chesster.
+
+The database URL comes from the CHESSTER_DATABASE_URL environment variable
+(default sqlite:///chesster.db), so a deployment can move to another file or
+another database without code changes. For SQLite every connection gets the
+pragmas from SQLITE_PRAGMAS (WAL journal, busy timeout, synchronous level and
+mmap size) and connections are pooled instead of opened per request.
+
+Views wrapped in read_only() run their queries on a separate engine: a
+read-only connection to the same SQLite file (mode=ro), or the database named
+by CHESSTER_READ_DATABASE_URL, e.g. a replica. With WAL, those readers never
+wait for a writer.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+import threading
+
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+DEFAULT_DATABASE_URL = 'sqlite:///chesster.db'
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers don't block the writer and vice versa
+    'busy_timeout': 5000,  # Milliseconds to wait for a lock instead of failing with "database is locked"
+    'synchronous': 'NORMAL',  # Consistent with WAL, skips an fsync per commit but may lose the last commits on power loss
+    'mmap_size': 256 * 1024 * 1024
+}
+
+# Set while a read_only() block runs
+_read_only = ContextVar('read_only', default=False)
+
+
+def configure_storage(app):
+    """Fill in the database URL, pool and pragma settings of an app, explicit settings win"""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', os.environ.get('CHESSTER_DATABASE_URL', DEFAULT_DATABASE_URL))
+    app.config.setdefault('CHESSTER_READ_DATABASE_URL', os.environ.get('CHESSTER_READ_DATABASE_URL'))
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+    if app.config.get('MOVE_GROUP_COMMIT'):
+        # Moves are acknowledged once their group commit returns, so that
+        # commit must also survive a power loss; one fsync covers the batch
+        pragmas['synchronous'] = 'FULL'
+    app.config.setdefault('SQLITE_PRAGMAS', pragmas)
+    app.config.setdefault('DATABASE_POOL_SIZE', int(os.environ.get('CHESSTER_DATABASE_POOL_SIZE', 10)))
+    app.config.setdefault('DATABASE_MAX_OVERFLOW', int(os.environ.get('CHESSTER_DATABASE_MAX_OVERFLOW', 10)))
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+
+def engine_options(config, url=None):
+    """create_engine options for the configured database (or the given URL)"""
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    options = {
+        'pool_size': config['DATABASE_POOL_SIZE'],
+        'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+        'pool_timeout': 30
+    }
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}  # One shared in-memory connection, Flask-SQLAlchemy handles it
+        # Without an explicit pool class SQLAlchemy opens a new file connection per checkout
+        options['poolclass'] = QueuePool
+        options['connect_args'] = {'check_same_thread': False}
+    else:
+        options['pool_pre_ping'] = True
+    return options
+
+
+def _sqlite_pragma_listener(pragmas, read_only=False):
+    """Build a connect listener that applies the pragmas to every new SQLite connection"""
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                if name == 'journal_mode' and read_only:
+                    continue  # Set by the writer, a read-only connection can't change it
+                cursor.execute(f"PRAGMA {name}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+    return apply_pragmas
+
+
+@contextmanager
+def read_only():
+    """
+    Run the queries of a block (or a decorated view) on the read-only engine
+    Only for code that doesn't write, flushes still go to the primary database
+    """
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the queries of read_only() blocks to the read-only engine"""
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.db = db
+
+    def get_bind(self, mapper=None, clause=None):
+        if _read_only.get() and not self._flushing:
+            engine = self.db.get_read_only_engine(self.app)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+def after_commit(session, callback):
+    """Call callback() once the session's current transaction commits, never if it rolls back"""
+    session.info.setdefault('after_commit', []).append(callback)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _run_after_commit(session):
+    for callback in session.info.pop('after_commit', ()):
+        callback()
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _drop_after_commit(session, transaction):
+    if transaction.parent is None:
+        # Rolled back or closed, the changes the callbacks stand for never happened
+        session.info.pop('after_commit', None)
+
+
+class Storage(SQLAlchemy):
+    """Flask-SQLAlchemy with SQLite pragmas and a read-only engine for read_only() blocks"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._read_only_lock = threading.Lock()
+        self._read_only_engines = {}  # primary database URL -> read-only engine (or None)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        if engine.dialect.name == 'sqlite':
+            pragmas = self.get_app().config.get('SQLITE_PRAGMAS', {})
+            event.listen(engine, 'connect', _sqlite_pragma_listener(pragmas))
+        return engine
+
+    def get_read_only_engine(self, app=None):
+        """
+        Get the engine for read_only() blocks, created on first use
+        Returns None when there is no read-only database (e.g. in-memory SQLite)
+        """
+        app = self.get_app(app)
+        primary = self.get_engine(app)
+        key = str(primary.url)
+        if key in self._read_only_engines:
+            return self._read_only_engines[key]
+
+        with self._read_only_lock:
+            if key not in self._read_only_engines:
+                self._read_only_engines[key] = self._create_read_only_engine(app, primary)
+            return self._read_only_engines[key]
+
+    @staticmethod
+    def _create_read_only_engine(app, primary):
+        """Create the read-only engine that goes with a primary engine, or None"""
+        engine = None
+        read_url = app.config.get('CHESSTER_READ_DATABASE_URL')
+        if read_url:
+            engine = create_engine(read_url, **engine_options(app.config, read_url))
+        elif primary.dialect.name == 'sqlite' and primary.url.database not in (None, '', ':memory:'):
+            # Same file, opened read-only through a SQLite URI
+            url = f"sqlite:///file:{primary.url.database}?mode=ro&uri=true"
+            engine = create_engine(url, **engine_options(app.config, url))
+
+        if engine is not None and engine.dialect.name == 'sqlite':
+            pragmas = app.config.get('SQLITE_PRAGMAS', {})
+            event.listen(engine, 'connect', _sqlite_pragma_listener(pragmas, read_only=True))
+        return engine
@@ -0,0 +1,40 @@
+import time
+
+from src.utils.lru_cache import LRUCache
+
+
+class TTLCache(LRUCache):
+    """
+    Small bounded cache whose entries expire a fixed time after they were stored.
+
+    Meant for read-mostly results that may be slightly stale, like search pages.
+    The least recently used entry is dropped when the cache is full. Cached
+    values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl=5, capacity=256):
+        super().__init__(capacity)
+        self.ttl = ttl  # Entries are (expires_at, value)
+
+    def get(self, key):
+        """Return the cached value for a key, or None if it is missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Cache a value under a key and return it"""
+        super().put(key, (time.monotonic() + self.ttl, value))
+        return value
+
+    def invalidate(self, key):
+        """Drop a single entry"""
+        self.pop(key)
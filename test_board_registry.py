@@ -0,0 +1,85 @@
+"""
+Live board cache checks: a cached board never outlives the move it was pushed
+for, and the cache counters are reported by /api/stats.
+
+Run with: python -m pytest test_board_registry.py
+"""
+import chess
+import pytest
+
+from app import app
+from conftest import create_games, play_moves
+from src.models.game import Game
+from src.models.user import db
+from src.services.game_service import GameService
+from src.utils.board_registry import board_registry
+from src.utils.lru_cache import LRUCache
+from src.utils.position_cache import position_cache
+
+
+def test_cached_board_at_the_right_ply_but_wrong_position_is_rebuilt(client):
+    game_id = create_games(1)[0]
+    play_moves(game_id, ['e2e4'])
+
+    # Another writer replaced the move, the game is back at ply 1 with d4 played
+    board = chess.Board()
+    board.push_uci('d2d4')
+    with app.app_context():
+        game = Game.query.get(game_id)
+        game.board_state = board.fen()
+        db.session.commit()
+
+    play_moves(game_id, ['d7d5'])
+    board.push_uci('d7d5')
+    with app.app_context():
+        assert Game.query.get(game_id).board_state == board.fen()
+
+
+def test_failed_move_commit_evicts_the_cached_board(client, monkeypatch):
+    game_id = create_games(1)[0]
+    play_moves(game_id, ['e2e4'])
+
+    with app.app_context():
+        game = Game.query.get(game_id)
+        black_id = game.black_player_id
+
+        def failing_commit():
+            raise RuntimeError('disk I/O error')
+
+        monkeypatch.setattr(db.session, 'commit', failing_commit)
+        with pytest.raises(RuntimeError):
+            GameService.make_move(game_id, black_id, 'e7', 'e5')
+        monkeypatch.undo()
+
+        assert game_id not in board_registry._boards
+        game = Game.query.get(game_id)
+        assert game.ply == 1
+
+    play_moves(game_id, ['c7c5'])
+    with app.app_context():
+        assert Game.query.get(game_id).board_state.startswith('rnbqkbnr/pp1ppppp/8/2p5/4P3/')
+
+
+def test_cache_counters_are_reported(client):
+    game_id = create_games(1)[0]
+    position_cache.clear()
+    for _ in range(3):
+        assert client.get(f'/api/games/{game_id}').status_code == 200
+
+    stats = client.get('/api/stats').get_json()
+    assert stats['position_cache'] == position_cache.stats()
+    assert (stats['position_cache']['hits'], stats['position_cache']['misses']) == (2, 1)
+    assert stats['board_registry']['size'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(capacity=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get_or_add('a', lambda: 0) == 1
+    assert cache.get_or_add('d', lambda: 4) == 4
+    assert 'c' not in cache
+    assert (cache.hits, cache.misses) == (1, 0)
@@ -0,0 +1,75 @@
+"""
+Draw rule checks: threefold repetition and the fifty-move rule.
+
+Run with: python -m pytest test_draw_rules.py
+"""
+from datetime import datetime, timedelta
+
+from app import app
+from conftest import alice_id, create_games, play_moves
+from src.models.game import Game
+from src.models.position import GamePosition
+from src.models.user import User, db
+from src.services.game_service import GameService
+from src.services.timer_scheduler import turn_timers
+from src.utils.board_registry import board_registry
+
+
+def test_threefold_repetition_ends_the_game_as_a_draw(client):
+    shuffle = ['g1f3', 'g8f6', 'f3g1', 'f6g8']
+    first, second = create_games(2)
+
+    play_moves(first, shuffle + shuffle[:3])
+    # A cache miss seeds the repetition table from the position index
+    board_registry.clear()
+    play_moves(first, shuffle[3:])
+
+    play_moves(second, shuffle)
+    with app.app_context():
+        # Games without index rows are replayed from their moves instead
+        GamePosition.query.filter_by(game_id=second).delete()
+        db.session.commit()
+    board_registry.clear()
+    play_moves(second, shuffle[:3])
+    with app.app_context():
+        assert Game.query.get(second).status == 'active'
+    play_moves(second, shuffle[3:])
+
+    with app.app_context():
+        for game_id in (first, second):
+            game = Game.query.get(game_id)
+            assert (game.status, game.ply, game.winner_id) == ('draw', 8, None)
+
+
+def test_fifty_move_rule_ends_the_game_as_a_draw(client):
+    game_id = create_games(1)[0]
+    with app.app_context():
+        game = Game.query.get(game_id)
+        game.board_state = '4k3/8/8/8/8/8/8/R3K3 w - - 99 80'
+        game.ply = 158
+        db.session.commit()
+    board_registry.clear()
+    play_moves(game_id, ['a1a2'])
+    with app.app_context():
+        assert Game.query.get(game_id).status == 'draw'
+
+
+def test_draw_by_a_random_move_on_time_expiration_is_rated(client):
+    game_id = create_games(1)[0]
+    with app.app_context():
+        User.query.filter_by(id=alice_id()).update({'elo_rating': 1500})
+        game = Game.query.get(game_id)
+        game.board_state = '4k3/8/8/8/8/8/8/R3K3 w - - 99 80'
+        game.ply = 158
+        game.last_move_time = datetime.utcnow() - timedelta(minutes=5)
+        db.session.commit()
+        turn_timers.schedule(game)
+    board_registry.clear()
+
+    with app.app_context():
+        assert GameService.check_expired_timers() == [game_id]
+        game = Game.query.get(game_id)
+        assert game.status == 'draw'
+        # The higher rated player loses points for the draw
+        assert User.query.get(alice_id()).elo_rating < 1500
+        assert User.query.filter(User.id != alice_id()).order_by(User.elo_rating.desc()).first().elo_rating > 1200
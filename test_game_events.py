@@ -0,0 +1,40 @@
+"""
+Game event stream checks.
+
+Run with: python -m pytest test_game_events.py
+"""
+import json
+import threading
+
+from conftest import create_games, play_moves
+from src.services.game_events import game_events
+
+
+def read_state(body):
+    """Read the next state event of an event stream"""
+    for chunk in body:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event: state'):
+            return json.loads(chunk.split('data: ', 1)[1])
+
+
+def test_move_made_while_connecting_is_not_lost(client, monkeypatch):
+    game_id = create_games(1)[0]
+    subscribe = game_events.subscribe
+
+    def subscribe_after_a_move(subscribed_game_id):
+        # The opponent's move lands just before the subscription
+        mover = threading.Thread(target=play_moves, args=(game_id, ['e2e4']))
+        mover.start()
+        mover.join()
+        return subscribe(subscribed_game_id)
+
+    monkeypatch.setattr(game_events, 'subscribe', subscribe_after_a_move)
+    response = client.get(f'/api/games/{game_id}/events', buffered=False)
+    assert response.status_code == 200
+    try:
+        assert read_state(iter(response.response))['current_turn'] == 'black'
+        assert game_events.subscriber_count(game_id) == 1
+    finally:
+        response.close()
+    assert game_events.subscriber_count(game_id) == 0
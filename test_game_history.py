@@ -0,0 +1,56 @@
+"""
+Game history checks: keyset pages over (end_time, id) across both colours.
+
+Run with: python -m pytest test_game_history.py
+"""
+from datetime import datetime, timedelta
+
+from app import app
+from conftest import alice_id, create_games
+from src.models.game import Game
+from src.models.user import User, db
+from src.services.game_service import GameService
+
+
+def test_history_pages_cover_every_game_once(client):
+    game_ids = create_games(7, finished=True)
+    create_games(1)  # Still active, never listed
+    noon = datetime(2024, 1, 1, 12)
+    with app.app_context():
+        bob, carol = (User.query.filter_by(username=name).first().id for name in ('bob', 'carol'))
+        other = GameService.create_game(bob, carol)
+        other.resign(bob)
+
+        alice = alice_id()
+        for index, game_id in enumerate(game_ids):
+            game = Game.query.get(game_id)
+            # Alice plays both colours, and three games end at the same moment
+            opponent = game.black_player_id if game.white_player_id == alice else game.white_player_id
+            players = (alice, opponent) if index % 2 else (opponent, alice)
+            game.white_player_id, game.black_player_id = players
+            game.end_time = noon if index in (2, 3, 4) else noon + timedelta(minutes=index)
+        db.session.commit()
+        expected = [
+            game.id for game in sorted(
+                (Game.query.get(game_id) for game_id in game_ids),
+                key=lambda game: (game.end_time, game.id), reverse=True
+            )
+        ]
+
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get(f'/api/game-history?limit=2&cursor={cursor}')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['games']) <= 2
+        seen += [game['id'] for game in data['games']]
+        cursor = data['next_cursor']
+    assert seen == expected
+
+    # The last full page ends the walk without an empty extra page
+    data = client.get('/api/game-history?limit=7').get_json()
+    assert [game['id'] for game in data['games']] == expected
+    assert data['next_cursor'] is None
+
+    assert client.get('/api/game-history?cursor=not-a-cursor').status_code == 400
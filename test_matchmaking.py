@@ -0,0 +1,208 @@
+"""
+Matchmaking checks: pairing under concurrency, the long-poll handoff, window
+widening, offline players and queue positions.
+
+Run with: python -m pytest test_matchmaking.py
+"""
+from datetime import timedelta
+import threading
+
+import pytest
+
+from app import app
+from src.models.game import Game
+from src.models.game_queue import GameQueue
+from src.models.user import User
+from src.services.matchmaking import ArrivalIndex, Matchmaker
+from src.services.presence import presence
+
+
+@pytest.fixture
+def players(client):
+    """Put everyone online and map usernames to user ids"""
+    presence.clear()
+    with app.app_context():
+        users = User.query.all()
+        for user in users:
+            presence.touch(user)
+        return {user.username: user.id for user in users}
+
+
+def in_context(function, *args):
+    """Run a matchmaker call in its own app context, as a request would"""
+    with app.app_context():
+        return function(*args)
+
+
+def run_threads(*calls):
+    """Run (function, args) calls at the same time, returns their results in order"""
+    results = [None] * len(calls)
+    barrier = threading.Barrier(len(calls))
+
+    def run(index, function, args):
+        barrier.wait()
+        results[index] = in_context(function, *args)
+
+    threads = [threading.Thread(target=run, args=(index, function, args)) for index, (function, args) in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def queued_user_ids():
+    with app.app_context():
+        return sorted(row.user_id for row in GameQueue.query.all())
+
+
+def test_racing_joins_are_paired_exactly_once(players):
+    for _ in range(10):
+        matchmaker = Matchmaker()
+        results = run_threads(
+            (matchmaker.join, (players['alice'], 1200)),
+            (matchmaker.join, (players['bob'], 1200))
+        )
+        assert sorted(status for status, _ in results) == ['matched', 'queued']
+        match = next(match for status, match in results if status == 'matched')
+        waiting = players['alice'] if results[0][0] == 'queued' else players['bob']
+        assert matchmaker.poll(waiting) == ('matched', match)
+        assert len(matchmaker) == 0
+        assert queued_user_ids() == []
+
+    with app.app_context():
+        assert Game.query.count() == 10
+
+
+def test_long_polling_player_gets_the_match_once_the_game_exists(players, monkeypatch):
+    matchmaker = Matchmaker()
+    assert in_context(matchmaker.join, players['alice'], 1200) == ('queued', None)
+
+    creating, release = threading.Event(), threading.Event()
+    create_match = matchmaker._create_match
+
+    def slow_create_match(user_id, opponent_id):
+        creating.set()
+        release.wait(5)
+        return create_match(user_id, opponent_id)
+
+    monkeypatch.setattr(matchmaker, '_create_match', slow_create_match)
+    results = {}
+    waiter = threading.Thread(target=lambda: results.update(
+        waited=in_context(matchmaker.wait_for_match, players['alice'], 5)
+    ))
+    joiner = threading.Thread(target=lambda: results.update(
+        joined=in_context(matchmaker.join, players['bob'], 1250)
+    ))
+    waiter.start()
+    joiner.start()
+
+    assert creating.wait(5)
+    # Reserved while the game is created, the long poll keeps waiting
+    assert matchmaker.poll(players['alice']) == ('matching', None)
+    release.set()
+    joiner.join()
+    waiter.join()
+
+    status, match = results['joined']
+    assert status == 'matched'
+    assert results['waited'] == ('matched', match)
+    assert matchmaker.poll(players['alice']) == ('not_in_queue', None)
+
+
+def test_search_window_widens_while_waiting(players):
+    matchmaker = Matchmaker(base_window=100, window_growth=10, max_window=600)
+    assert in_context(matchmaker.join, players['alice'], 1200) == ('queued', None)
+    assert in_context(matchmaker.join, players['bob'], 1450) == ('queued', None)
+    assert in_context(matchmaker.wait_for_match, players['alice'], 0) == ('waiting', None)
+
+    # Alice has been waiting for 20 seconds, her window is now 300 points
+    entry = matchmaker._queue[players['alice']]
+    entry.joined_at -= timedelta(seconds=20)
+    assert matchmaker.window(entry, entry.joined_at + timedelta(seconds=20)) == 300
+    status, match = in_context(matchmaker.wait_for_match, players['alice'], 0)
+    assert status == 'matched'
+    assert matchmaker.poll(players['bob']) == ('matched', match)
+    assert queued_user_ids() == []
+
+
+def test_offline_neighbours_are_dropped_instead_of_paired(players):
+    matchmaker = Matchmaker()
+    assert in_context(matchmaker.join, players['carol'], 1200) == ('queued', None)
+    status, match = in_context(matchmaker.join, players['bob'], 1210)
+    assert status == 'matched'
+    assert matchmaker.poll(players['carol']) == ('matched', match)
+
+    assert in_context(matchmaker.join, players['carol'], 1200) == ('queued', None)
+    presence.remove(players['carol'])
+    assert in_context(matchmaker.join, players['bob'], 1190) == ('queued', None)
+
+    assert matchmaker.poll(players['carol']) == ('not_in_queue', None)
+    assert len(matchmaker) == 1
+    assert queued_user_ids() == [players['bob']]
+
+
+def test_queue_positions_follow_arrivals(players):
+    matchmaker = Matchmaker(base_window=10, window_growth=0)
+    for name, rating in (('alice', 1200), ('bob', 1600), ('carol', 2000)):
+        assert in_context(matchmaker.join, players[name], rating) == ('queued', None)
+    assert [matchmaker.position(players[name]) for name in ('alice', 'bob', 'carol')] == [1, 2, 3]
+
+    assert in_context(matchmaker.leave, players['bob'])
+    assert matchmaker.position(players['carol']) == 2
+    assert in_context(matchmaker.join, players['bob'], 1600) == ('queued', None)
+    assert [matchmaker.position(players[name]) for name in ('alice', 'carol', 'bob')] == [1, 2, 3]
+
+
+def test_arrival_index_keeps_ranks_when_it_grows():
+    index = ArrivalIndex(capacity=4)
+    for seq in range(1, 6):
+        index.add(seq, 1)
+    index.add(2, -1)
+    for seq in range(6, 20):
+        index.add(seq, 1)  # Grows past 4 and 8 and 16
+    index.add(7, -1)
+
+    assert [index.rank(seq) for seq in (1, 2, 3, 6, 7, 8, 19)] == [1, 1, 2, 5, 5, 6, 17]
+    assert index.rank(100) == 17
+
+
+def test_row_written_after_pairing_is_taken_back_out(players, monkeypatch):
+    matchmaker = Matchmaker()
+    persist_join = matchmaker._persist_join
+    results = {}
+
+    def pair_before_persisting(entry):
+        # Bob is paired with alice between her join and its GameQueue row
+        joiner = threading.Thread(target=lambda: results.update(
+            joined=in_context(matchmaker.join, players['bob'], 1200)
+        ))
+        joiner.start()
+        joiner.join()
+        persist_join(entry)
+
+    monkeypatch.setattr(matchmaker, '_persist_join', pair_before_persisting)
+    assert in_context(matchmaker.join, players['alice'], 1200) == ('queued', None)
+    assert results['joined'][0] == 'matched'
+    assert queued_user_ids() == []
+
+
+def test_arrival_numbers_stay_bounded_while_the_queue_never_drains(players):
+    matchmaker = Matchmaker(base_window=10, window_growth=0)
+    matchmaker._arrivals = ArrivalIndex(capacity=8)
+    ratings = {'alice': 1200, 'bob': 1600, 'carol': 2000}
+    for name, rating in ratings.items():
+        assert in_context(matchmaker.join, players[name], rating) == ('queued', None)
+
+    order = list(ratings)
+    for _ in range(100):
+        # The longest waiting player leaves and comes straight back
+        name = order.pop(0)
+        assert in_context(matchmaker.leave, players[name])
+        assert in_context(matchmaker.join, players[name], ratings[name]) == ('queued', None)
+        order.append(name)
+        assert [matchmaker.position(players[name]) for name in order] == [1, 2, 3]
+
+    assert matchmaker._seq <= 8
+    assert len(matchmaker._arrivals._tree) == 9
+    assert queued_user_ids() == sorted(players.values())
@@ -0,0 +1,159 @@
+"""
+Group commit checks: batched move writes, stale writes rejected by ply,
+timed out writes never landing, and timer moves on the same ply check.
+
+Run with: python -m pytest test_move_committer.py
+"""
+from datetime import datetime, timedelta
+import threading
+
+import chess
+from flask import Flask
+import pytest
+
+from app import app
+from conftest import create_games, play_moves
+from src.models.game import ChessMove, Game
+from src.models.user import db
+from src.services.game_service import GameService
+from src.services.move_committer import move_committer
+from src.services.timer_scheduler import turn_timers
+from src.utils.board_registry import board_registry
+from src.utils.storage import configure_storage
+
+
+@pytest.fixture
+def group_commit(client):
+    move_committer.configure(enabled=True, interval=0.5)
+    yield move_committer
+    move_committer.configure(enabled=app.config['MOVE_GROUP_COMMIT'], interval=app.config['MOVE_GROUP_COMMIT_INTERVAL'])
+
+
+def make_move(game_id, uci, results):
+    """Play a move as whoever's turn it is, through the service"""
+    with app.app_context():
+        game = Game.query.get(game_id)
+        player_id = game.white_player_id if game.current_turn == 'white' else game.black_player_id
+        results[game_id] = GameService.make_move(game_id, player_id, uci[:2], uci[2:4])
+
+
+def test_concurrent_moves_share_one_commit(group_commit):
+    game_ids = create_games(4)
+    before = group_commit.stats()
+
+    results = {}
+    threads = [threading.Thread(target=make_move, args=(game_id, 'e2e4', results)) for game_id in game_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    after = group_commit.stats()
+    assert all(success for success, _ in results.values())
+    assert (after['batches'] - before['batches'], after['writes'] - before['writes']) == (1, 4)
+    with app.app_context():
+        for game_id in game_ids:
+            game = Game.query.get(game_id)
+            assert (game.ply, game.current_turn) == (1, 'black')
+            assert [move.move_notation for move in ChessMove.query.filter_by(game_id=game_id)] == ['e4']
+
+
+def test_move_from_an_old_ply_is_rejected_and_its_board_evicted(group_commit, monkeypatch):
+    game_id = create_games(1)[0]
+    commit_move = group_commit.commit_move
+
+    def commit_after_a_rival_move(game, expected_ply):
+        # Another request commits a different move from the same ply first
+        rival = threading.Thread(target=play_moves, args=(game_id, ['d2d4']))
+        rival.start()
+        rival.join()
+        return commit_move(game, expected_ply)
+
+    monkeypatch.setattr(group_commit, 'commit_move', commit_after_a_rival_move)
+    rejected = group_commit.stats()['rejected']
+    results = {}
+    make_move(game_id, 'e2e4', results)
+
+    assert results[game_id][0] is False
+    assert group_commit.stats()['rejected'] == rejected + 1
+    assert game_id not in board_registry._boards
+
+    board = chess.Board()
+    board.push_uci('d2d4')
+    with app.app_context():
+        game = Game.query.get(game_id)
+        assert (game.ply, game.board_state) == (1, board.fen())
+        assert [move.move_notation for move in ChessMove.query.filter_by(game_id=game_id)] == ['d4']
+
+
+def test_group_commit_syncs_every_commit():
+    for group_commit, synchronous in ((False, 'NORMAL'), (True, 'FULL')):
+        config_app = Flask(__name__)
+        config_app.config['MOVE_GROUP_COMMIT'] = group_commit
+        configure_storage(config_app)
+        assert config_app.config['SQLITE_PRAGMAS']['synchronous'] == synchronous
+
+
+def test_timed_out_move_is_cancelled_before_it_is_written(group_commit, monkeypatch):
+    busy_id, game_id = create_games(2)
+    writing, release = threading.Event(), threading.Event()
+    write = group_commit._write
+
+    def slow_write(batch):
+        writing.set()
+        release.wait(5)
+        write(batch)
+
+    monkeypatch.setattr(group_commit, '_write', slow_write)
+    results = {}
+    busy = threading.Thread(target=make_move, args=(busy_id, 'e2e4', results))
+    busy.start()
+    assert writing.wait(5)
+
+    # The committer is stuck on another batch, the move times out while queued
+    group_commit.timeout = 0.2
+    with pytest.raises(RuntimeError):
+        make_move(game_id, 'e2e4', results)
+    assert game_id not in board_registry._boards
+    release.set()
+    busy.join()
+
+    assert results[busy_id][0] is True
+    assert group_commit.stats()['cancelled'] == 1
+    with app.app_context():
+        assert Game.query.get(game_id).ply == 0
+        assert ChessMove.query.filter_by(game_id=game_id).count() == 0
+
+
+@pytest.mark.parametrize('enabled', [True, False])
+def test_timer_move_loses_to_a_move_committed_first(group_commit, monkeypatch, enabled):
+    group_commit.enabled = enabled
+    game_id = create_games(1)[0]
+    with app.app_context():
+        game = Game.query.get(game_id)
+        game.last_move_time = datetime.utcnow() - timedelta(minutes=5)
+        db.session.commit()
+        turn_timers.schedule(game)
+
+    make_random_move = Game.make_random_move
+    results = {}
+
+    def random_move_after_a_player_move(game):
+        # The player's move is committed after the timer loaded the game
+        player = threading.Thread(target=make_move, args=(game_id, 'd2d4', results))
+        player.start()
+        player.join()
+        return make_random_move(game)
+
+    monkeypatch.setattr(Game, 'make_random_move', random_move_after_a_player_move)
+    with app.app_context():
+        assert GameService.check_expired_timers() == []
+    assert results[game_id][0] is True
+    assert game_id not in board_registry._boards
+
+    with app.app_context():
+        game = Game.query.get(game_id)
+        assert (game.ply, game.current_turn) == (1, 'black')
+        assert [move.move_notation for move in ChessMove.query.filter_by(game_id=game_id)] == ['d4']
+    # Rescheduled from the player's move
+    assert turn_timers._deadlines[game_id][1] == 1
@@ -0,0 +1,52 @@
+"""
+Move list checks: packed games read back the same as row stored games, and
+conditional requests for the moves after a ply.
+
+Run with: python -m pytest test_move_log.py
+"""
+from app import app
+from conftest import create_games, play_moves, queries_for
+
+
+def test_packed_game_moves_match_row_moves(client):
+    app.config['PACKED_MOVE_LOG'] = True
+    try:
+        packed_id = create_games(1)[0]
+    finally:
+        app.config['PACKED_MOVE_LOG'] = False
+    rows_id = create_games(1)[0]
+
+    for game_id in (packed_id, rows_id):
+        play_moves(game_id, ['e2e4'])
+    one_move = queries_for(client, f'/api/games/{packed_id}/moves')
+
+    opening = ['e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6']
+    for game_id in (packed_id, rows_id):
+        play_moves(game_id, opening)
+    many_moves = queries_for(client, f'/api/games/{packed_id}/moves')
+    assert many_moves == one_move
+
+    def moves(game_id, since=0):
+        data = client.get(f'/api/games/{game_id}/moves?since={since}').get_json()
+        return [{key: move[key] for key in ('ply', 'from_square', 'to_square', 'move_notation')}
+                for move in data['moves']]
+
+    assert moves(packed_id) == moves(rows_id)
+    assert moves(packed_id, since=4) == moves(rows_id, since=4)
+    last_move = client.get(f'/api/games/{packed_id}').get_json()['game']['last_move']
+    assert last_move['ply'] == 6 and last_move['move_notation'] == 'Nf6'
+
+
+def test_moves_etag_depends_on_since(client):
+    game_id = create_games(1)[0]
+    play_moves(game_id, ['e2e4', 'e7e5'])
+
+    url = f'/api/games/{game_id}/moves'
+    etag = client.get(f'{url}?since=0').headers['ETag']
+    assert client.get(f'{url}?since=0', headers={'If-None-Match': etag}).status_code == 304
+    response = client.get(f'{url}?since=1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [move['ply'] for move in response.get_json()['moves']] == [2]
+
+    for since in ('-1', 'abc'):
+        assert client.get(f'{url}?since={since}', headers={'If-None-Match': etag}).status_code == 400
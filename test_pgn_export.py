@@ -0,0 +1,60 @@
+"""
+PGN export checks.
+
+Run with: python -m pytest test_pgn_export.py
+"""
+import io
+
+import chess.pgn
+
+from app import app
+from conftest import alice_id, count_queries, create_games, login, play_moves
+from src.models.game import Game
+from src.models.user import db
+from src.services.pgn_export import pgn_exporter
+
+
+def test_pgn_export_streams_games_in_batches(client, monkeypatch):
+    monkeypatch.setattr(pgn_exporter, 'batch_size', 2)
+    app.config['PACKED_MOVE_LOG'] = True
+    try:
+        packed_ids = create_games(2)
+    finally:
+        app.config['PACKED_MOVE_LOG'] = False
+    row_ids = create_games(3)
+    lines = {}
+    for index, game_id in enumerate(packed_ids + row_ids):
+        lines[game_id] = ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1b5'][:index + 1]
+        play_moves(game_id, lines[game_id])
+    with app.app_context():
+        # Time expired random moves carry their note into the export
+        Game.query.get(packed_ids[0]).make_random_move()
+        for game_id in packed_ids + row_ids[:2]:
+            Game.query.get(game_id).resign(alice_id())
+        db.session.commit()
+
+    with count_queries() as queries:
+        response = client.get('/api/export/pgn', buffered=False)
+        assert response.is_streamed
+        body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    # Two queries per page of games and one for each kind of move storage in it
+    assert len(queries) <= 3 * 2 + 2 * 2
+
+    games = []
+    stream = io.StringIO(body)
+    while (game := chess.pgn.read_game(stream)) is not None:
+        games.append(game)
+    # The active game is left out, the rest oldest first
+    assert [game.headers['Event'] for game in games] == [f'Chesster game #{game_id}' for game_id in packed_ids + row_ids[:2]]
+    for game in games:
+        game_id = int(game.headers['Event'].split('#')[1])
+        moves = [move.uci() for move in game.mainline_moves()]
+        assert moves[:len(lines[game_id])] == lines[game_id]
+        assert game.headers['Result'] in ('1-0', '0-1')
+    assert 'Random move due to time limit expiration' in body
+
+    login('bob')
+    response = client.get('/api/export/pgn?user=bob')
+    assert 'Chesster game' in response.get_data(as_text=True)
+    assert client.get('/api/export/pgn?user=nobody').status_code == 404
@@ -0,0 +1,88 @@
+"""
+Player list checks: the in-memory leaderboard and the online player search.
+
+Run with: python -m pytest test_players.py
+"""
+from app import app
+from conftest import count_queries, create_games, login
+from src.models.game import Game
+from src.models.user import db
+from src.services.game_service import GameService
+from src.services.leaderboard import leaderboard
+from src.services.presence import presence
+
+
+def test_leaderboard_is_served_from_memory(client):
+    with app.app_context():
+        leaderboard.load()
+    game_ids = create_games(3, finished=True)
+    with app.app_context():
+        for game_id in game_ids:
+            GameService._update_player_ratings(Game.query.get(game_id))
+        db.session.commit()
+
+    with count_queries() as queries:
+        response = client.get('/api/leaderboard?per_page=2')
+    assert response.status_code == 200
+    # The ranking never hits the database, alice is only reloaded because
+    # her rating changed since she was cached
+    assert len(queries) == 1
+
+    data = response.get_json()
+    assert data['total'] == 3
+    assert [player['rank'] for player in data['players']] == [1, 2]
+    ratings = [player['elo_rating'] for player in data['players']]
+    assert ratings == sorted(ratings, reverse=True)
+    assert data['me']['rank'] == 3  # alice resigned every game
+    assert data['me']['elo_rating'] < 1200
+
+
+def test_available_players_search_and_pages(client):
+    presence.clear()
+    client.get('/api/auth/me')
+    response = client.get('/api/available-players')
+    assert response.get_json()['players'] == []  # Nobody else is online
+
+    login('bob')
+    carol = login('carol')
+
+    response = client.get('/api/available-players?q=b')
+    assert [player['username'] for player in response.get_json()['players']] == ['bob']
+
+    usernames = []
+    cursor = ''
+    while cursor is not None:
+        data = client.get(f'/api/available-players?limit=1&cursor={cursor}').get_json()
+        usernames += [player['username'] for player in data['players']]
+        cursor = data['next_cursor']
+    assert usernames == ['bob', 'carol']
+
+    response = client.get('/api/available-players?min_rating=1300')
+    assert response.get_json()['players'] == []
+
+    carol.post('/api/auth/logout')
+    response = client.get('/api/available-players')
+    assert [player['username'] for player in response.get_json()['players']] == ['bob']
+
+    # Searches never hit the database and the session user is cached
+    with count_queries() as queries:
+        client.get('/api/available-players?q=b')
+    assert len(queries) == 0
+
+
+def test_leaderboard_only_takes_committed_ratings(client):
+    with app.app_context():
+        leaderboard.load()
+    game_id = create_games(1, finished=True)[0]
+    ratings = [player['elo_rating'] for player in leaderboard.page()[0]]
+
+    with app.app_context():
+        GameService._update_player_ratings(Game.query.get(game_id))
+        db.session.rollback()
+        db.session.commit()  # A later commit doesn't bring the rolled back ratings back
+    assert [player['elo_rating'] for player in leaderboard.page()[0]] == ratings
+
+    with app.app_context():
+        GameService._update_player_ratings(Game.query.get(game_id))
+        db.session.commit()
+    assert [player['elo_rating'] for player in leaderboard.page()[0]] != ratings
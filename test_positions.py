@@ -0,0 +1,81 @@
+"""
+Position checks: past positions from board checkpoints and the position
+explorer over the Zobrist index.
+
+Run with: python -m pytest test_positions.py
+"""
+import chess
+
+from app import app
+from conftest import alice_id, create_games, play_moves, queries_for
+from src.models.game import Game
+from src.models.position import BoardCheckpoint
+from src.models.user import db
+
+
+def test_position_at_any_ply_comes_from_the_nearest_checkpoint(client):
+    app.config['PACKED_MOVE_LOG'] = True
+    try:
+        packed_id = create_games(1)[0]
+    finally:
+        app.config['PACKED_MOVE_LOG'] = False
+    rows_id = create_games(1)[0]
+
+    # 40 plies without repeating a position, so checkpoints at 16 and 32
+    line = ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6', 'd2d3', 'f8c5', 'c2c3', 'd7d6',
+            'b2b4', 'c5b6', 'a2a4', 'a7a6', 'e1g1', 'e8g8', 'h2h3', 'h7h6', 'c1e3', 'c8e6',
+            'b1d2', 'b6a7', 'd1c2', 'd8e7', 'a1e1', 'a8e8', 'g2g4', 'g7g5', 'g1g2', 'g8g7',
+            'f1h1', 'f8h8', 'a4a5', 'a7b8', 'd3d4', 'e5d4', 'c3d4', 'c6d4', 'f3d4', 'e6c4']
+    board = chess.Board()
+    expected = [board.fen()]
+    for uci in line:
+        board.push_uci(uci)
+        expected.append(board.fen())
+
+    for game_id in (packed_id, rows_id):
+        play_moves(game_id, line)
+        counts = set()
+        for ply, fen in enumerate(expected):
+            url = f'/api/games/{game_id}/position?ply={ply}'
+            if ply:
+                counts.add(queries_for(client, url))
+            data = client.get(url).get_json()
+            assert (data['ply'], data['fen']) == (ply, fen)
+        assert len(counts) == 1
+        assert data['last_move'] == {'from_square': 'e6', 'to_square': 'c4'}
+
+    with app.app_context():
+        assert [checkpoint.ply for checkpoint in BoardCheckpoint.query.filter_by(game_id=rows_id)] == [16, 32]
+    for ply in ('41', '-1', 'abc', ''):
+        assert client.get(f'/api/games/{rows_id}/position?ply={ply}').status_code == 400
+
+
+def test_explorer_finds_games_through_the_position_index(client):
+    finished, active = create_games(2)
+    for game_id, line in ((finished, ['e2e4', 'e7e5', 'g1f3']), (active, ['e2e4', 'e7e5', 'f1c4'])):
+        play_moves(game_id, line)
+    with app.app_context():
+        Game.query.get(finished).resign(alice_id())
+        db.session.commit()
+
+    fen = 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2'
+    one_game = queries_for(client, f'/api/explorer?fen={fen}')
+    data = client.get(f'/api/explorer?fen={fen}').get_json()
+    # Active games are left out
+    assert data['total_games'] == 1
+    assert [move['san'] for move in data['moves']] == ['Nf3']
+    assert [(game['id'], game['ply']) for game in data['games']] == [(finished, 2)]
+
+    for game_id in create_games(3):
+        play_moves(game_id, ['e2e4', 'e7e5', 'b1c3'])
+        with app.app_context():
+            Game.query.get(game_id).resign(alice_id())
+            db.session.commit()
+    assert queries_for(client, f'/api/explorer?fen={fen}') == one_game
+    assert client.get(f'/api/explorer?fen={fen}').get_json()['total_games'] == 4
+
+    with app.app_context():
+        plan = ' '.join(row[-1] for row in db.session.execute(db.text(
+            'EXPLAIN QUERY PLAN SELECT game_id FROM game_position WHERE position_hash = 1'
+        )))
+    assert 'ix_game_position_hash' in plan
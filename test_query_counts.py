@@ -0,0 +1,51 @@
+"""
+Query count checks for the read endpoints.
+
+Asserts that listing games and moves costs the same number of queries no
+matter how many rows are returned (no N+1 relationship loads).
+
+Run with: python -m pytest test_query_counts.py
+"""
+from conftest import create_games, play_moves, queries_for
+
+
+def test_active_games_query_count_is_constant(client):
+    create_games(1)
+    one_game = queries_for(client, '/api/active-games')
+
+    create_games(5)
+    many_games = queries_for(client, '/api/active-games')
+
+    assert many_games == one_game
+
+
+def test_game_history_query_count_is_constant(client):
+    create_games(1, finished=True)
+    one_game = queries_for(client, '/api/game-history')
+
+    create_games(5, finished=True)
+    many_games = queries_for(client, '/api/game-history')
+
+    assert many_games == one_game
+
+
+def test_game_moves_query_count_is_constant(client):
+    game_id = create_games(1)[0]
+    play_moves(game_id, ['e2e4'])
+    one_move = queries_for(client, f'/api/games/{game_id}/moves')
+
+    play_moves(game_id, ['e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6'])
+    many_moves = queries_for(client, f'/api/games/{game_id}/moves')
+
+    assert many_moves == one_move
+
+
+def test_game_state_query_count_is_constant(client):
+    game_id = create_games(1)[0]
+    play_moves(game_id, ['e2e4'])
+    one_move = queries_for(client, f'/api/games/{game_id}')
+
+    play_moves(game_id, ['e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6'])
+    many_moves = queries_for(client, f'/api/games/{game_id}')
+
+    assert many_moves == one_move
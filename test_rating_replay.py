@@ -0,0 +1,42 @@
+"""
+Rating replay checks: the vectorized Elo replay matches live play, and the
+Glicko-2 update matches the worked example in Glickman's paper.
+
+Run with: python -m pytest test_rating_replay.py
+"""
+import numpy as np
+import pytest
+
+from src.models.user import User
+from src.services.rating_replay import GLICKO2_SCALE, glicko2_period, replay_elo
+
+
+def test_elo_replay_matches_game_by_game_updates():
+    rng = np.random.default_rng(7)
+    white = rng.integers(0, 6, 300)
+    black = (white + rng.integers(1, 6, 300)) % 6  # Never the same player
+    white_score = rng.choice([0.0, 0.5, 1.0], 300)
+
+    # The update of GameService._update_player_ratings, one game at a time
+    players = [User(username=f'player{i}', elo_rating=1200) for i in range(6)]
+    for w, b, score in zip(white.tolist(), black.tolist(), white_score.tolist()):
+        players[w].update_rating(players[b].elo_rating, score)
+        players[b].update_rating(players[w].elo_rating, 1 - score)
+
+    ratings = replay_elo(white, black, white_score, 6)
+    assert ratings.tolist() == [player.elo_rating for player in players]
+
+
+def test_glicko2_period_matches_the_published_example():
+    # A 1500/200 player beats a 1400/30 player, loses to 1550/100 and 1700/300
+    ratings = np.array([1500, 1400, 1550, 1700])
+    deviations = np.array([200, 30, 100, 300])
+    mu = (ratings - 1500) / GLICKO2_SCALE
+    phi = deviations / GLICKO2_SCALE
+    sigma = np.full(4, 0.06)
+
+    glicko2_period(mu, phi, sigma, np.array([0, 0, 0]), np.array([1, 2, 3]), np.array([1.0, 0.0, 0.0]), tau=0.5)
+
+    assert 1500 + GLICKO2_SCALE * mu[0] == pytest.approx(1464.06, abs=0.01)
+    assert GLICKO2_SCALE * phi[0] == pytest.approx(151.52, abs=0.01)
+    assert sigma[0] == pytest.approx(0.05999, abs=1e-5)
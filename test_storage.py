@@ -0,0 +1,57 @@
+"""
+Storage checks: read_only() blocks query the mode=ro engine, which refuses
+writes, and the database URLs can come from the environment.
+
+Run with: python -m pytest test_storage.py
+"""
+from flask import Flask
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import app
+from src.models.user import User, db
+from src.utils.storage import DEFAULT_DATABASE_URL, configure_storage, read_only
+
+
+def test_read_only_block_uses_the_read_only_engine(client):
+    with app.app_context():
+        engine = db.get_read_only_engine()
+        assert engine is not db.engine
+        assert 'mode=ro' in str(engine.url)
+
+        used = []
+        for name, target in (('primary', db.engine), ('read_only', engine)):
+            event.listen(target, 'before_cursor_execute', lambda *args, name=name: used.append(name))
+        with read_only():
+            assert User.query.filter_by(username='bob').count() == 1
+        User.query.filter_by(username='bob').count()
+        assert used == ['read_only', 'primary']
+
+        with read_only():
+            with pytest.raises(OperationalError, match='readonly'):
+                db.session.execute(User.__table__.update().values(elo_rating=0))
+        db.session.rollback()
+        assert User.query.filter_by(elo_rating=0).count() == 0
+
+
+def test_database_urls_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('CHESSTER_DATABASE_URL', 'sqlite:////srv/chesster/primary.db')
+    monkeypatch.setenv('CHESSTER_READ_DATABASE_URL', 'sqlite:////srv/chesster/replica.db')
+    other = Flask('other')
+    configure_storage(other)
+    assert other.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:////srv/chesster/primary.db'
+    assert other.config['CHESSTER_READ_DATABASE_URL'] == 'sqlite:////srv/chesster/replica.db'
+
+    # Explicit settings win over the environment
+    explicit = Flask('explicit')
+    explicit.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///explicit.db'
+    configure_storage(explicit)
+    assert explicit.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///explicit.db'
+
+    monkeypatch.delenv('CHESSTER_DATABASE_URL')
+    monkeypatch.delenv('CHESSTER_READ_DATABASE_URL')
+    default = Flask('default')
+    configure_storage(default)
+    assert default.config['SQLALCHEMY_DATABASE_URI'] == DEFAULT_DATABASE_URL
+    assert default.config['CHESSTER_READ_DATABASE_URL'] is None
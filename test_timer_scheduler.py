@@ -0,0 +1,71 @@
+"""
+Turn timer checks: the deadline heap behind the random moves on time expiration.
+
+Run with: python -m pytest test_timer_scheduler.py
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import threading
+import time
+
+from src.services.timer_scheduler import TurnTimerScheduler
+
+
+def game(game_id, seconds_left, ply=0, status='active'):
+    """A stand-in for a Game with 3 second turns"""
+    last_move_time = datetime.utcnow() + timedelta(seconds=seconds_left - 3)
+    return SimpleNamespace(id=game_id, ply=ply, status=status, last_move_time=last_move_time, turn_time_limit=3)
+
+
+def test_pop_due_only_returns_games_past_their_deadline():
+    timers = TurnTimerScheduler()
+    timers.schedule(game(1, -1))
+    timers.schedule(game(2, 60))
+    timers.schedule(game(3, -2))
+
+    assert sorted(timers.pop_due()) == [1, 3]
+    assert timers.pop_due() == []
+    assert len(timers) == 1
+    assert timers.pop_due(datetime.utcnow() + timedelta(minutes=2)) == [2]
+
+
+def test_move_replaces_the_old_deadline():
+    timers = TurnTimerScheduler()
+    timers.schedule(game(1, -1))
+    # A move was made in time, the next turn has just started
+    timers.schedule(game(1, 3, ply=1))
+
+    assert timers.pop_due() == []
+    assert len(timers) == 1
+    assert timers.pop_due(datetime.utcnow() + timedelta(seconds=10)) == [1]
+
+
+def test_cancelled_and_finished_games_are_never_due():
+    timers = TurnTimerScheduler()
+    timers.schedule(game(1, -1))
+    timers.schedule(game(2, -1))
+    timers.cancel(1)
+    timers.schedule(game(2, -1, ply=5, status='resigned'))
+
+    assert timers.pop_due() == []
+    assert len(timers) == 0
+
+
+def test_waiting_timer_wakes_for_a_nearer_deadline():
+    timers = TurnTimerScheduler()
+    timers.schedule(game(1, 3600))
+    woke_after = []
+
+    def wait():
+        started = time.monotonic()
+        timers.wait_for_due(max_wait=30)
+        woke_after.append(time.monotonic() - started)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.2)
+    timers.schedule(game(2, 0.1))
+    waiter.join(5)
+
+    assert not waiter.is_alive()
+    assert woke_after[0] < 5
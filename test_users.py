@@ -0,0 +1,98 @@
+"""
+User checks: ratings never come from cached copies of a player, and password
+hashing gives up on a stuck worker and survives a dead one.
+
+Run with: python -m pytest test_users.py
+"""
+from concurrent.futures.process import BrokenProcessPool
+import os
+import signal
+import time
+
+import pytest
+from sqlalchemy import event
+
+from app import app
+from conftest import alice_id, create_games
+from src.models.game import Game
+from src.models.user import User, db
+from src.services.game_service import GameService
+from src.services.user_cache import user_cache
+from src.utils.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+def test_ratings_are_updated_from_the_stored_rows(client):
+    game_id = create_games(1, finished=True)[0]  # alice resigned
+    with app.app_context():
+        user_cache.load(alice_id())
+        # The rating changes behind the cache's back
+        User.query.filter_by(username='alice').update({'elo_rating': 1500})
+        db.session.commit()
+
+    with app.app_context():
+        alice = user_cache.load(alice_id())
+        assert alice.elo_rating == 1200  # Merged from the stale cached copy
+        game = Game.query.get(game_id)
+        GameService._update_player_ratings(game)
+        db.session.commit()
+        assert 1400 < alice.elo_rating < 1500
+        assert alice.battles_lost == 1
+
+    with app.app_context():
+        # Dropped on commit, so the next load sees the new row
+        assert user_cache.load(alice_id()).elo_rating == alice.elo_rating
+
+
+def test_load_racing_an_invalidation_does_not_fill_the_cache(client):
+    user_cache.clear()
+    with app.app_context():
+        user_id = alice_id()
+
+        def invalidate_during_select(conn, cursor, statement, parameters, context, executemany):
+            user_cache.invalidate(user_id)
+
+        event.listen(db.engine, 'before_cursor_execute', invalidate_during_select, once=True)
+        try:
+            assert user_cache.load(user_id).id == user_id
+        finally:
+            if event.contains(db.engine, 'before_cursor_execute', invalidate_during_select):
+                event.remove(db.engine, 'before_cursor_execute', invalidate_during_select)
+    assert user_cache.stats()['size'] == 0
+
+    with app.app_context():
+        user_cache.load(user_id)
+    assert user_cache.stats()['size'] == 1
+
+
+def test_password_hash_timeout_is_reported_as_busy():
+    hasher = PasswordHasher(workers=1, method='pbkdf2:sha256:1000', timeout=0.5)
+    with pytest.raises(PasswordHasherBusy):
+        hasher._run(time.sleep, 2)
+    assert hasher._executor._mp_context.get_start_method() != 'fork'
+
+    hasher.timeout = 10
+    assert hasher.verify(hasher.hash('testing123'), 'testing123')
+    stats = hasher.stats()
+    # Only the calls that returned a result are timed
+    assert (stats['completed'], stats['timed_out'], stats['in_flight']) == (2, 1, 0)
+    hasher._executor.shutdown()
+
+
+def test_password_hasher_restarts_its_pool_after_a_worker_dies():
+    hasher = PasswordHasher(workers=1, method='pbkdf2:sha256:1000', timeout=10)
+    password_hash = hasher.hash('testing123')
+
+    # Killed while idle, e.g. by the OOM killer
+    for pid in list(hasher._executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    assert hasher.verify(password_hash, 'testing123')
+
+    # A call that kills every worker it runs on is only retried once
+    with pytest.raises(BrokenProcessPool):
+        hasher._run(os._exit, 1)
+    assert hasher.verify(password_hash, 'testing123')
+
+    stats = hasher.stats()
+    assert stats['restarts'] >= 3
+    assert (stats['completed'], stats['in_flight']) == (3, 0)
+    hasher._executor.shutdown()
@@ -1,13 +1,14 @@
 from flask import Flask
 from src.models.user import db
+from src.utils.storage import configure_storage
 import os
 from sqlalchemy import text
 from datetime import datetime
 import sqlite3
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///chesster.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_storage(app)
 db.init_app(app)
 
 def column_exists(table, column):
@@ -38,7 +39,84 @@ with app.app_context():
             db.session.execute(text("UPDATE game SET last_move_time = start_time"))
         else:
             print("last_move_time column already exists.")
-        
+
+        # Check and add ply column
+        if not column_exists('game', 'ply'):
+            print("Adding ply column to game table...")
+            db.session.execute(text('ALTER TABLE game ADD COLUMN ply INTEGER NOT NULL DEFAULT 0'))
+
+            # Existing games have played one ply per stored move
+            print("Updating existing games with their ply count...")
+            db.session.execute(text(
+                "UPDATE game SET ply = (SELECT COUNT(*) FROM chess_move WHERE chess_move.game_id = game.id)"
+            ))
+        else:
+            print("ply column already exists.")
+
+        # Check and add the ply column of the move table
+        if not column_exists('chess_move', 'ply'):
+            print("Adding ply column to chess_move table...")
+            db.session.execute(text('ALTER TABLE chess_move ADD COLUMN ply INTEGER'))
+
+            # Number existing moves within their game in insertion order
+            print("Numbering existing moves...")
+            db.session.execute(text(
+                "UPDATE chess_move SET ply = (SELECT COUNT(*) FROM chess_move AS earlier "
+                "WHERE earlier.game_id = chess_move.game_id AND earlier.id <= chess_move.id)"
+            ))
+        else:
+            print("chess_move ply column already exists.")
+
+        # Check and add the packed_moves column
+        if not column_exists('game', 'packed_moves'):
+            print("Adding packed_moves column to game table...")
+            db.session.execute(text('ALTER TABLE game ADD COLUMN packed_moves BOOLEAN NOT NULL DEFAULT 0'))
+        else:
+            print("packed_moves column already exists.")
+
+        print("Creating packed move log table...")
+        db.session.execute(text(
+            'CREATE TABLE IF NOT EXISTS game_move_log ('
+            'game_id INTEGER NOT NULL PRIMARY KEY REFERENCES game (id), '
+            'started_at DATETIME NOT NULL, '
+            'last_move_at DATETIME NOT NULL, '
+            'codes BLOB NOT NULL, '
+            'times BLOB NOT NULL)'
+        ))
+
+        print("Creating position index table...")
+        db.session.execute(text(
+            'CREATE TABLE IF NOT EXISTS game_position ('
+            'game_id INTEGER NOT NULL REFERENCES game (id), '
+            'ply INTEGER NOT NULL, '
+            'position_hash BIGINT NOT NULL, '
+            'move_code INTEGER, '
+            'PRIMARY KEY (game_id, ply)) WITHOUT ROWID'
+        ))
+        db.session.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_game_position_hash ON game_position (position_hash, game_id, ply)'
+        ))
+
+        print("Creating board checkpoint table...")
+        db.session.execute(text(
+            'CREATE TABLE IF NOT EXISTS board_checkpoint ('
+            'game_id INTEGER NOT NULL REFERENCES game (id), '
+            'ply INTEGER NOT NULL, '
+            'fen TEXT NOT NULL, '
+            'PRIMARY KEY (game_id, ply)) WITHOUT ROWID'
+        ))
+
+        print("Creating move index...")
+        db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_chess_move_game_ply ON chess_move (game_id, ply)'))
+
+        print("Creating game history indexes...")
+        db.session.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_game_white_history ON game (white_player_id, end_time, id, status)'
+        ))
+        db.session.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_game_black_history ON game (black_player_id, end_time, id, status)'
+        ))
+
         # Commit the changes
         db.session.commit()
         